@@ -0,0 +1,47 @@
+"""Benchmark bioscreen.convert_time against the previous per value strptime implementation.
+
+usage: python benchmarks/bioscreen_time.py [timepoints]
+
+time stamps are 15 minutes apart, the strptime implementation only handles
+runs shorter than a month (less than 2976 timepoints)."""
+
+import sys, time, datetime, timeit
+import pandas as pd
+import numpy as np
+from popmachine import bioscreen
+
+def _parse_time(t):
+	try:
+		return datetime.datetime(*time.struct_time(time.strptime(t,'%H:%M:%S'))[:-2])
+	except ValueError, e:
+		t = time.strptime(t,'%d %H:%M:%S')
+		t = list(t)
+		t[2]+=1
+
+		return datetime.datetime(*time.struct_time(t)[:-2])
+
+def convert_time_strptime(stamps):
+	stamps = stamps.apply(_parse_time)
+	delta = stamps - stamps[0]
+	return delta.dt.total_seconds()/3600.
+
+def stamps(n, interval=15*60):
+	"""n bioscreen time stamps, interval seconds apart."""
+	ret = []
+	for i in range(n):
+		d, s = divmod(i*interval, 86400)
+		stamp = "%02d:%02d:%02d" % (s/3600, s%3600/60, s%60)
+		if d > 0:
+			stamp = "%d %s" % (d, stamp)
+		ret.append(stamp)
+	return pd.Series(ret)
+
+if __name__ == '__main__':
+	n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+	s = stamps(n)
+
+	assert np.allclose(bioscreen.convert_time(s), convert_time_strptime(s))
+
+	for name, f in [('strptime', convert_time_strptime), ('vectorized', bioscreen.convert_time)]:
+		t = min(timeit.repeat(lambda: f(s), number=10, repeat=3))/10
+		print "%-10s %8d timepoints: %8.2f ms" % (name, n, t*1000)
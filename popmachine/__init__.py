@@ -1,4 +1,5 @@
 # from core import *
 from machine import Machine
 from dataset import DataSet
+from search import Between, Not, Less, LessEqual, Greater, GreaterEqual
 import models
@@ -1,6 +1,6 @@
 import argparse, logging, api
 from popmachine import Machine
-from operation import PlateCreate, PlateDelete, DesignList, DesignSetType, SearchOperation, Import
+from operation import PlateCreate, PlateDelete, DesignList, DesignSetType, SearchOperation, Import, BatchImport, DatabaseAnalyze
 from operation.server import ServerOperation
 import pandas as pd
 from models import Plate, Well, Design, ExperimentalDesign, Base
@@ -37,6 +37,8 @@ def main():
     parser = argparse.ArgumentParser(prog='popmachine',description='Growth data database management in Python.')
     parser.add_argument('--database', type=str,
                         help='location of the databse', default='.popmachine.db')
+    parser.add_argument('--storage', type=str, choices=['table', 'long'],
+                        help='storage of new plate data', default='table')
     parser.add_argument("--verbose", action='store_true')
 
     subparsers = parser.add_subparsers(help='command to run')
@@ -58,7 +60,9 @@ def main():
 
     imp = subparsers.add_parser('import', help='import data from a directory')
     imp.add_argument("directory", help='directory to import from')
-    imp.set_defaults(func=lambda x: Import.fromArgs(machine, x).run())
+    imp.add_argument("--batch", action='store_true', help='import every plate directory under directory (or matching a glob)')
+    imp.add_argument("--processes", type=int, default=None, help='number of processes parsing plate files in batch mode')
+    imp.set_defaults(func=lambda x: (BatchImport if x.batch else Import).fromArgs(machine, x).run())
 
     #   Plates
     plate = subparsers.add_parser('plate', help='plate commands')
@@ -105,6 +109,16 @@ def main():
     designSetType.add_argument("type")
     designSetType.set_defaults(func=lambda x: DesignSetType.fromArgs(machine,x).run())
 
+    # Database
+
+    db = subparsers.add_parser('db', help='database commands')
+    dbSubparsers = db.add_subparsers(help='database sub-commands')
+
+    #   analyze
+
+    dbAnalyze = dbSubparsers.add_parser("analyze", help='report full table scans of the search queries')
+    dbAnalyze.set_defaults(func=lambda x: DatabaseAnalyze.fromArgs(machine, x).run())
+
     #############
 
 
@@ -113,7 +127,7 @@ def main():
     args,extras = parser.parse_known_args()
 
 
-    machine = Machine(args.database)
+    machine = Machine(args.database, args.storage)
 
     # print args
 
@@ -1,13 +1,14 @@
-from flask import render_template
+from flask import render_template, url_for
 
 import numpy as np
+import pandas as pd
 
 from bokeh.embed import components
 from bokeh.plotting import figure
 from bokeh.charts import TimeSeries
-from bokeh.resources import INLINE
+from bokeh.resources import INLINE, Resources
 from bokeh.util.string import encode_utf8
-from bokeh.palettes import Spectral11, viridis
+from bokeh.palettes import Spectral11, viridis, Viridis256
 from bokeh.io import output_file, show, vform
 from bokeh.layouts import widgetbox
 from bokeh.models import CustomJS, ColumnDataSource, Plot
@@ -15,21 +16,150 @@ from bokeh.models.widgets import Dropdown
 from bokeh.models.glyphs import MultiLine
 from bokeh.layouts import column, row
 
+from popmachine.downsample import lttb
+from collections import OrderedDict
+import uuid, json, threading
+import bokeh
+
+# color of missing values, see colorby
+MISSING = '#d3d3d3'
+
+# BokehJS is served as static files (see views.bokeh_static), under a path
+# holding the bokeh version so browsers can cache them for good
+resources = Resources(mode='server', root_url='/bokeh/%s/' % bokeh.__version__)
+js_resources = resources.render_js()
+css_resources = resources.render_css()
+
+class ComponentsCache(object):
+    """The latest maxsize values put, by key: the (script, div, token) of the
+    plots rendered, and the loaders of the data of plots (see plots)."""
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if not key in self.entries:
+                return None
+            value = self.entries.pop(key)
+            self.entries[key] = value
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = value
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+rendered = ComponentsCache()
+
+# (load, wells) of the plots served, by token. load() returns the plotted
+# dataset through Machine.get, so zooming in on the full resolution data
+# reuses the machine's cache instead of keeping a second copy of it
+plots = ComponentsCache(1024)
+
 def colorby(values):
+    """a viridis color for each value, in O(n).
+
+    Values are numbered in order of appearance (pd.factorize) and spread over
+    the palette, missing values are gray. The color-by dropdown of plotDataset
+    maps a meta column the same way in the browser (see colorjs)."""
+
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+
+    n = len(uniques)
+    size = min(n, len(Viridis256))
+    color = np.array(list(Viridis256) + [MISSING])
+
+    index = (codes*size//max(n, 1))*(len(Viridis256)-1)//max(size-1, 1)
+    index[codes < 0] = len(Viridis256)
+
+    return color[index].tolist()
+
+# colorby in javascript, sets color to the colors of values
+colorjs = """
+    var palette = %s, missing = %s;
+    var codes = {}, n = 0, i, key;
+    var isMissing = function (v) { return v === null || v === undefined || (typeof v === 'number' && isNaN(v)); };
+
+    for (i = 0; i < values.length; i++) {
+        key = JSON.stringify(values[i]);
+        if (!isMissing(values[i]) && !(key in codes)) {
+            codes[key] = n++;
+        }
+    }
+
+    var size = Math.min(n, palette.length);
+    for (i = 0; i < values.length; i++) {
+        if (isMissing(values[i])) {
+            color[i] = missing;
+        } else {
+            color[i] = palette[Math.floor(Math.floor(codes[JSON.stringify(values[i])]*size/Math.max(n, 1))*(palette.length-1)/Math.max(size-1, 1))];
+        }
+    }
+""" % (json.dumps(list(Viridis256)), json.dumps(MISSING))
+
+def curves(ds, start=None, stop=None, points=800):
+    """the xs and ys of each well of ds between times start and stop,
+    downsampled to points per well (see downsample.lttb), missing values as None.
 
-    if not values.dtype == int:
-        values = [values.unique().tolist().index(v) for v in values]
+    The samples just outside of start and stop are included, so the lines
+    reach the edges of a zoomed in plot."""
 
-    v = viridis(max(values)+1)
-    color = [v[c] for c in values]
+    data = ds.data.sort_index()
+    data = data[~np.isnan(data.index.values)]
 
-    return color
+    time = data.index.values
+    first = 0 if start is None else max(np.searchsorted(time, start, 'left') - 1, 0)
+    last = len(time) if stop is None else min(np.searchsorted(time, stop, 'right') + 1, len(time))
+    data = data.iloc[first:max(first, last)]
 
-def plotDataset(ds,template='dataset.html',title='Dataset',color=None,*args, **kwargs):
+    x, y = data.index.values, data.values
+    index = lttb(x, y, points)
 
-    ds = ds.copy()
-    ds.data.columns = ds.data.columns.astype(str)
+    xs = [x[index[:,j]].tolist() for j in range(y.shape[1])]
+    ys = [[None if v != v else v for v in y[index[:,j], j].tolist()] for j in range(y.shape[1])]
+
+    return xs, ys
+
+def plotDataset(ds,template='dataset.html',title='Dataset',color=None,points=800,key=None,load=None,*args, **kwargs):
+    """render template with a plot of ds.
+
+    When a key is given (e.g. the query, color-by design and database
+    generation) the plot's components are reused for the same key. load
+    fetches ds again for the full resolution data of zoomed in plots, which
+    are otherwise only downsampled."""
+
+    cached = None if key is None else rendered.get(key)
+
+    if cached is None:
+        token = uuid.uuid4().hex
+        script, div = _components(ds, token, title, color, points)
+        if not key is None:
+            rendered.put(key, (script, div, token))
+    else:
+        script, div, token = cached
+
+    # the curves are sent downsampled, the full resolution is fetched from
+    # plot_data when zooming in
+    if not load is None and plots.get(token) is None:
+        plots.put(token, (load, ds.shape[1]))
+
+    html = render_template(
+        template,
+        plot_script=script,
+        plot_div=div,
+        js_resources=js_resources,
+        css_resources=css_resources,
+        *args, **kwargs
+    )
+    return encode_utf8(html)
 
+def _components(ds, token, title, color, points):
+    """the script and div of ds's plot, see plotDataset."""
 
     # ts = TimeSeries(ds.data)
 
@@ -43,11 +173,11 @@ def plotDataset(ds,template='dataset.html',title='Dataset',color=None,*args, **k
     # print color
 
     # source = ColumnDataSource(data=ds.data)
-    source = ColumnDataSource(dict(xs=[ds.data.index.values]*ds.data.shape[1],
-                ys = [ds.data[name].values for name in ds.data], yslog = [np.log2(ds.data[name].values) for name in ds.data], color=color, label=label))
+    xs, ys = curves(ds, points=points)
+    source = ColumnDataSource(dict(xs=xs, ys=ys, color=color, label=label))
 
+    # the colors of other columns are only computed when selected, from labelsource
     labelsource = ColumnDataSource(ds.meta)
-    colorsource = ColumnDataSource({k:colorby(ds.meta[k]) for k in ds.meta.columns.tolist()})
 
 
     # if color is None:
@@ -74,33 +204,37 @@ def plotDataset(ds,template='dataset.html',title='Dataset',color=None,*args, **k
     # fig.add_glyph(source, glyph)
     # plot.add_glyph(source, glyph)
 
-    callback = CustomJS(args=dict(source=source,colorsource=colorsource,labelsource=labelsource), code="""
+    callback = CustomJS(args=dict(source=source,labelsource=labelsource), code="""
         var data = source.get('data');
-        var data2 = colorsource.get('data');
         var data3 = labelsource.get('data');
         var f = cb_obj.get('value')
 
-        color = data['color']
-        color2 = data2[f]
+        var color = data['color']
+        var values = data3[f]
 
         label = data['label']
-        label2 = data3[f]
-
-        for (i = 0; i < color.length; i++) {
-            color[i] = color2[i]
-            label[i] = label2[i]
+        for (i = 0; i < label.length; i++) {
+            label[i] = values[i]
         }
-
+    """ + colorjs + """
         source.trigger('change');
     """)
 
-    logcallback = CustomJS(args=dict(source=source), code="""
-        var data = source.get('data');
-
-        data['ys'] = data['yslog']
-
-        source.trigger('change');
+    # replace the curves with the ones of the visible range, once zooming stops
+    rangecallback = CustomJS(args=dict(source=source), code="var url = %s, points = %d;" % (json.dumps(url_for('plot_data', token=token)), points) + """
+        var range = cb_obj;
+        clearTimeout(window.popmachineZoom);
+
+        window.popmachineZoom = setTimeout(function () {
+            $.getJSON(url, {start: range.get('start'), end: range.get('end'), points: points}, function (res) {
+                var data = source.get('data');
+                data['xs'] = res.xs;
+                data['ys'] = res.ys;
+                source.trigger('change');
+            });
+        }, 250);
     """)
+    fig.x_range.callback = rangecallback
 
 
     menu = [(c,c) for c in ds.meta.columns]
@@ -109,19 +243,5 @@ def plotDataset(ds,template='dataset.html',title='Dataset',color=None,*args, **k
     # layout = vform(dropdown, fig)
     layout = column(dropdown, fig)
 
-    js_resources = INLINE.render_js()
-    css_resources = INLINE.render_css()
-
     # script, div = components(ts)
-    script, div = components(layout)
-    # script, div = components(fig)
-
-    html = render_template(
-        template,
-        plot_script=script,
-        plot_div=div,
-        js_resources=js_resources,
-        css_resources=css_resources,
-        *args, **kwargs
-    )
-    return encode_utf8(html)
+    return components(layout)
@@ -1,10 +1,15 @@
 from app import app
-from flask import Flask, render_template, request, jsonify, url_for, redirect, flash
-from popmachine import Machine, models
+from flask import Flask, render_template, request, jsonify, url_for, redirect, flash, Response, stream_with_context, send_from_directory, abort
+from popmachine import Machine, DataSet, models
+from popmachine.jobs import JobQueue, import_plate
+from popmachine.search import Not, Less, LessEqual, Greater, GreaterEqual
 from .forms import SearchForm, PlateCreate, DesignForm
-from .plot import plotDataset
+from .plot import plotDataset, plots, curves
 import pandas as pd
-import re
+import numpy as np
+import re, os, tempfile, json
+from collections import OrderedDict
+from io import BytesIO
 
 from bokeh.embed import components
 from bokeh.plotting import figure
@@ -12,9 +17,71 @@ from bokeh.charts import TimeSeries
 from bokeh.resources import INLINE
 from bokeh.util.string import encode_utf8
 from bokeh.palettes import Spectral11, viridis
+from bokeh.util.paths import bokehjsdir
+import bokeh
 
 machine = Machine()
 
+# plate uploads are written to the database in the background
+jobs = JobQueue(machine)
+
+@app.teardown_appcontext
+def remove_session(exception=None):
+    """each request uses the session of its thread, closed when the request ends."""
+    machine.remove()
+
+# search form comparison operators
+comparisons = {'<': Less, '<=': LessEqual, '>': Greater, '>=': GreaterEqual}
+
+# a search term, design name, operator and values
+term = re.compile("^\s*([0-9a-zA-Z -]*[0-9a-zA-Z-])\s*(>=|<=|!=|=|<|>)\s*([0-9a-zA-Z ,.-]*[0-9a-zA-Z,.-])\s*$")
+operator = re.compile(">=|<=|!=|=|<|>")
+# whitespace followed by the start of a term, name and operator
+boundary = re.compile("\s+(?=[0-9a-zA-Z-]+\s*(>=|<=|!=|=|<|>))")
+
+def search_terms(text):
+    """split a search into its terms.
+
+    Terms are separated by ";", or by whitespace once the current term has
+    its operator: "strain=wt,mutant temperature>=30" has two terms. Design
+    names with spaces can only start a term after a ";"."""
+
+    terms = []
+    for piece in text.split(";"):
+        start = 0
+        for m in boundary.finditer(piece):
+            if operator.search(piece[start:m.start()]):
+                terms.append(piece[start:m.start()])
+                start = m.end()
+        terms.append(piece[start:])
+
+    return [t for t in terms if t.strip() != '']
+
+def parse_search(text):
+    """the design keywords of a search, e.g. "strain=wt,mutant temperature>=30".
+
+    Raises ValueError for terms that are not design<op>values."""
+
+    kwargs = {}
+    for t in search_terms(text):
+        m = term.match(t)
+        if m is None:
+            raise ValueError("cannot parse search term '%s'" % t.strip())
+
+        k, op, v = m.groups()
+        v = [z.strip() for z in v.split(",") if z.strip() != '']
+
+        if op == '=':
+            kwargs[k] = v
+        elif op == '!=':
+            kwargs[k] = Not(v)
+        else:
+            if len(v) != 1:
+                raise ValueError("%s%s needs a single value" % (k, op))
+            kwargs[k] = comparisons[op](v[0])
+
+    return kwargs
+
 @app.route('/')
 def index():
     plates = machine.plates()
@@ -34,18 +101,21 @@ def plate(platename):
     searchform = SearchForm()
     plate = machine.session.query(models.Plate).filter(models.Plate.name==platename).one_or_none()
 
-    experimentalDesigns = machine.session.query(models.ExperimentalDesign)\
-                .join(models.well_experimental_design)\
-                .join(models.Well)\
-                .filter(models.Well.id.in_([w.id for w in plate.wells]))
+    if plate is None:
+        abort(404)
 
-    designs = machine.session.query(models.Design)\
+    # the experimental designs of the plate and their well counts, from its summary
+    values = machine.session.query(models.Design, models.ExperimentalDesign, models.PlateDesignValue.count)\
                 .join(models.ExperimentalDesign)\
-                .join(models.well_experimental_design)\
-                .join(models.Well)\
-                .filter(models.Well.id.in_([w.id for w in plate.wells]))
+                .join(models.PlateDesignValue)\
+                .filter(models.PlateDesignValue.plate_id==plate.id)\
+                .order_by(models.Design.name, models.ExperimentalDesign.number, models.ExperimentalDesign.value)
+
+    designs = OrderedDict()
+    for d, ed, count in values:
+        designs.setdefault(d, []).append((ed, count))
 
-    return render_template("plate.html", plate=plate, experimentalDesigns=experimentalDesigns, designs=designs, searchform = searchform)
+    return render_template("plate.html", plate=plate, summary=plate.summary, designs=designs, searchform = searchform)
 
 @app.route('/plate-delete/<platename>', methods=['GET', 'POST'])
 def plate_delete(platename):
@@ -70,29 +140,70 @@ def plate_create():
     else:
 
         name = request.form['name']
-        ignore = request.form['ignore'].split(",")
-        f = request.files['data']
-        data = pd.read_csv(f)
-
-        if 'design' in request.files:
-            f = request.files['design']
-            meta = pd.read_csv(f)
-
-            if len(ignore) > 0:
-                for i in ignore:
-                    if i == "":
-                        continue
-                    del meta[i]
-        else:
-            meta = None
+        ignore = [i for i in request.form['ignore'].split(",") if i != ""]
 
-        if request.form['source'] == 'csv':
-            machine.createPlate(name, data, meta)
-        else:
-            pass
+        # keep the uploads until the job has read them
+        def save(f):
+            fd, path = tempfile.mkstemp(suffix='.csv', prefix='popmachine-upload-')
+            os.close(fd)
+            f.save(path)
+            return path
 
-        return redirect(url_for('plates'))
+        data = save(request.files['data'])
+        meta = save(request.files['design']) if 'design' in request.files else None
+
+        id = jobs.submit('plate-create', name, import_plate, machine, name, data, meta, request.form['source'], ignore)
+
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify(id=id, status=url_for('job_status', id=id)), 202
+        return redirect(url_for('job', id=id))
+
+@app.route('/job/<int:id>')
+def job(id):
+    searchform = SearchForm()
+    job = jobs.status(id)
+
+    if job is None:
+        return render_template("job.html", job=job, searchform=searchform), 404
+    return render_template("job.html", job=job, searchform=searchform)
+
+@app.route('/job/<int:id>/status')
+def job_status(id):
+    job = jobs.status(id)
+
+    if job is None:
+        return jsonify(error='no job %d' % id), 404
+    return jsonify(**job)
+
+
+@app.route('/bokeh/<version>/static/<path:filename>')
+def bokeh_static(version, filename):
+    """BokehJS files, cached by browsers for a year as the path holds the version."""
+
+    if version != bokeh.__version__:
+        abort(404)
+    return send_from_directory(bokehjsdir(), filename, cache_timeout=365*24*3600)
+
+@app.route('/plot-data/<token>')
+def plot_data(token):
+    """the curves of a plotted dataset between times start and end, see plotDataset."""
+
+    plot = plots.get(token)
+    if plot is None:
+        return jsonify(error='plot %s expired' % token), 404
 
+    # the wells plotted changed since, the page needs to be reloaded
+    load, wells = plot
+    ds = load()
+    if ds is None or ds.shape[1] != wells:
+        return jsonify(error='plot %s expired' % token), 404
+
+    start = request.args.get('start', None, type=float)
+    end = request.args.get('end', None, type=float)
+    points = min(request.args.get('points', 800, type=int), 10000)
+
+    xs, ys = curves(ds, start, end, points)
+    return jsonify(xs=xs, ys=ys)
 
 @app.route('/designs/')
 def designs():
@@ -101,6 +212,31 @@ def designs():
 
     return render_template("designs.html", designs=designs, searchform=searchform)
 
+def design_wells(_id, plate=None):
+    """the query on the wells with a value of design _id, of plate if given."""
+
+    wells = machine.session.query(models.Well)\
+                .join(models.well_experimental_design)\
+                .join(models.ExperimentalDesign)\
+                .join(models.Design)\
+                .filter(models.Design.id==_id)
+
+    if not plate is None:
+        wells = wells.join(models.Plate).filter(models.Plate.name==plate)
+    return wells
+
+def experimental_design_wells(_id, plate=None):
+    """the query on the wells with experimental design _id, of plate if given."""
+
+    wells = machine.session.query(models.Well)\
+                .join(models.well_experimental_design)\
+                .join(models.ExperimentalDesign)\
+                .filter(models.ExperimentalDesign.id==_id)
+
+    if not plate is None:
+        wells = wells.join(models.Plate).filter(models.Plate.name==plate)
+    return wells
+
 @app.route('/design/<_id>',methods=['GET', 'POST'])
 @app.route('/design/<_id>/<plate>')
 def design(_id, plate=None):
@@ -121,27 +257,24 @@ def design(_id, plate=None):
                     .join(models.Design)\
                     .filter(models.Design.id==_id)
 
-        wells = machine.session.query(models.Well)\
-                    .join(models.well_experimental_design)\
-                    .join(models.ExperimentalDesign)\
-                    .join(models.Design)\
-                    .filter(models.Design.id==_id)
+        wells = design_wells(_id, plate)
 
         if not plate is None:
-            wells = wells.join(models.Plate).filter(models.Plate.name==plate)
-
             values = values.join(models.well_experimental_design)\
                         .join(models.Well)\
                         .join(models.Plate).filter(models.Plate.name==plate)
 
+        # read before the query, see Machine.get
+        generation = machine.generation
         ds = machine.get(wells, include=[design.name])
 
         assert not any(ds.meta[design.name].isnull())
 
-        color = map(lambda x: ds.meta[design.name].unique().tolist().index(x), ds.meta[design.name])
-
+        name = design.name
         return plotDataset(ds, 'design.html', color=ds.meta[design.name], values=values, design=design,
-                searchform=searchform, plate=plate, designform=designform)
+                searchform=searchform, plate=plate, designform=designform,
+                key=('design', design.id, plate, generation),
+                load=lambda: machine.get(design_wells(_id, plate), include=[name]))
 
     else:
         design.type = request.form['type']
@@ -157,17 +290,15 @@ def experimentalDesign(_id, plate=None):
     ed = machine.session.query(models.ExperimentalDesign)\
                 .filter(models.ExperimentalDesign.id==_id).one_or_none()
 
-    wells = machine.session.query(models.Well)\
-                .join(models.well_experimental_design)\
-                .join(models.ExperimentalDesign)\
-                .filter(models.ExperimentalDesign.id==_id)
-
-    if not plate is None:
-        wells = wells.join(models.Plate).filter(models.Plate.name==plate)
+    wells = experimental_design_wells(_id, plate)
 
+    generation = machine.generation
     ds = machine.get(wells, include=[ed.design.name])
 
-    return plotDataset(ds, "experimental-design.html", color=ds.meta[ed.design.name], wells=wells, experimentalDesign=ed, searchform=searchform)
+    name = ed.design.name
+    return plotDataset(ds, "experimental-design.html", color=ds.meta[ed.design.name], wells=wells, experimentalDesign=ed, searchform=searchform,
+                key=('experimentalDesign', ed.id, plate, generation),
+                load=lambda: machine.get(experimental_design_wells(_id, plate), include=[name]))
     return render_template("experimental-design.html", wells=wells, experimentalDesign=ed, searchform=searchform)
 
 @app.route('/search/',methods=['GET', 'POST'])
@@ -178,17 +309,15 @@ def search():
     if request.method=='GET':
         return render_template("search.html", searchform=searchform)
     else:
-        groups = re.findall("(([0-9a-zA-Z -]+)=([0-9a-zA-Z ,.-]+))", request.form['search'])
-
-        kwargs = {}
-        for _, k, v in groups:
-            k = k.strip().rstrip()
-            v = v.split(",")
-            v = [z.strip().rstrip() for z in v]
-            kwargs[k] = v
+        try:
+            kwargs = parse_search(request.form['search'])
+        except ValueError, e:
+            flash(str(e))
+            return render_template("search.html", searchform=searchform)
 
         # wells = machine.filter(**kwargs)
 
+        generation = machine.generation
         ds = machine.search(**kwargs)
 
         if ds is None:
@@ -198,9 +327,104 @@ def search():
             color = None
             # if len(groups)>0:
             for k, v in kwargs.iteritems():
-                if str(k) in ['include', 'plates']:
+                if str(k) in ['include', 'plates'] or not k in ds.meta.columns:
                     continue
-                color = map(lambda x: ds.meta[k].unique().tolist().index(x), ds.meta[k])
+                color = ds.meta[k]
                 break
 
-            return plotDataset(ds, 'dataset.html', searchform=searchform, dataset=ds)
+            text = request.form['search']
+            return plotDataset(ds, 'dataset.html', searchform=searchform, dataset=ds, color=color,
+                key=('search', text, generation),
+                load=lambda: machine.search(**parse_search(text)))
+
+
+def _jsonable(v):
+    """a python value for json, nan and missing values are None."""
+    if isinstance(v, np.generic):
+        v = v.item()
+    if v is None or (isinstance(v, float) and v != v):
+        return None
+    return v
+
+@app.route('/api/search/')
+def api_search():
+    """wells matching a search, as json, csv or numpy binary.
+
+    Arguments are search (the syntax of the search form), plates, numbers and
+    include (repeated or comma separated), format (json, csv or npz) and
+    offset and limit for pages of wells, in plate then well order. json and
+    csv are streamed chunksize wells at a time, npz is built in memory and
+    holds the page's time, data (time x wells) and a meta_<design> array for
+    each design. The total number of wells is in the X-Total-Count header and
+    the next page in the Link header."""
+
+    def getlist(k, type=unicode):
+        return [type(v) for l in request.args.getlist(k) for v in l.split(',') if v != '']
+
+    try:
+        kwargs = parse_search(request.args.get('search', ''))
+    except ValueError, e:
+        return jsonify(error=str(e)), 400
+    plates, numbers, include = getlist('plates'), getlist('numbers', int), getlist('include')
+
+    fmt = request.args.get('format', 'json')
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 1000, type=int), 1), 100000)
+    chunksize = max(request.args.get('chunksize', 100, type=int), 1)
+
+    if not fmt in ['json', 'csv', 'npz']:
+        return jsonify(error='unknown format %s' % fmt), 400
+
+    # each well once, whatever the number of its designs matched
+    matching = machine.filter(plates, numbers, **kwargs).with_entities(models.Well.id)
+    wells = machine.session.query(models.Well).filter(models.Well.id.in_(matching))\
+                .order_by(models.Well.plate_id, models.Well.plate_number)
+    total = wells.count()
+    wells = wells.offset(offset).limit(limit)
+    include = include + [k for k in kwargs.keys() if not k in include]
+
+    headers = {'X-Total-Count': str(total)}
+    after = None
+    if offset + limit < total:
+        args = request.args.to_dict(flat=False)
+        args.update(offset=offset+limit, limit=limit)
+        after = url_for('api_search', **args)
+        headers['Link'] = '<%s>; rel="next"' % after
+
+    if fmt == 'npz':
+        ds = machine.get(wells, include)
+        if ds is None:
+            ds = DataSet(np.zeros((0, 0)))
+
+        arrays = {'time': ds.data.index.values.astype(float), 'data': ds.data.values.astype(float)}
+        for c in ds.meta.columns:
+            arrays['meta_%s' % c] = np.array([unicode(v) for v in ds.meta[c]], dtype=unicode)
+
+        f = BytesIO()
+        np.savez(f, **arrays)
+        return Response(f.getvalue(), mimetype='application/octet-stream', headers=headers)
+
+    def stream():
+        if fmt == 'json':
+            yield '{"total": %d, "offset": %d, "limit": %d, "next": %s, "wells": [' % (total, offset, limit, json.dumps(after))
+
+        first = True
+        for ds in machine.get_iter(wells, include, chunksize):
+            if fmt == 'csv':
+                for tidy in ds.melt_iter(ds.meta.shape[0], categorical=False):
+                    yield tidy.to_csv(index=False, header=first, encoding='utf-8')
+                first = False
+                continue
+
+            time = [_jsonable(t) for t in ds.data.index.values.tolist()]
+            for j in range(ds.meta.shape[0]):
+                well = {'meta': dict([(k, _jsonable(v)) for k, v in ds.meta.iloc[j].iteritems()]),
+                        'time': time, 'od': [_jsonable(v) for v in ds.data.iloc[:,j].values.tolist()]}
+                yield ('' if first else ',') + json.dumps(well)
+                first = False
+
+        if fmt == 'json':
+            yield ']}'
+
+    mimetype = 'application/json' if fmt == 'json' else 'text/csv'
+    return Response(stream_with_context(stream()), mimetype=mimetype, headers=headers)
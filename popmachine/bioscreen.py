@@ -1,26 +1,72 @@
-import time, datetime
+import re, itertools
 import pandas as pd
+import numpy as np
+
+# bioscreen time stamps, %H:%M:%S during the first day and %d %H:%M:%S after
+_time_pattern = re.compile(r'^[ \t]*(?:(\d+)[ \t]+)?(\d+):(\d+):(\d+)[ \t]*$', re.M)
+
+# well columns of bioscreen exports, e.g. Well 101
+_well_pattern = re.compile(r'^\s*Well\s*(\d+)\s*$', re.I)
 
 def convert_time(time):
-	time = time.apply(_parse_time)
-	time = time.apply(_convert_delta_to_hours,args=(time[0],))
-	#time = time.round(2)
-	return time
-
-def _convert_delta_to_hours(time,t0):
-		delta = time - t0
-		return delta
-		#return 24*delta.days + float(delta.seconds)/3600
-
-def _parse_time(t):
-	try:
-		return datetime.datetime(*time.struct_time(time.strptime(t,'%H:%M:%S'))[:-2])
-	except ValueError, e:
+	"""convert a series of bioscreen time stamps to hours since the first one.
+
+	All stamps are matched in a single regular expression pass over the
+	joined column and converted to integer (days, hours, minutes, seconds)
+	arrays, the day is 0 when missing."""
+
+	seconds = _seconds(time)
+	if seconds.shape[0] > 0:
+		seconds = seconds - seconds[0]
+
+	return pd.Series(seconds/3600., index=time.index, name=time.name)
+
+def _seconds(time):
+	"""seconds since the start of the first day of each time stamp."""
+
+	text = '\n'.join(time.astype(unicode).values)
+	found = _time_pattern.findall(text)
+
+	if len(found) != time.shape[0] or text.count('\n') != time.shape[0] - 1:
+		raise Exception("Time format unknown")
+
+	parts = np.array(found, dtype='S20').reshape(-1, 4)
+	parts[parts == ''] = '0'
+
+	return parts.astype(np.int64).dot([86400, 3600, 60, 1])
+
+class Reader(object):
+	"""Streaming reader of Bioscreen C exports.
+
+	An export has a time column followed by one column per well, named
+	Well 101 to Well 300 (other columns, e.g. blanks, are ignored). The file
+	is parsed chunksize rows at a time, iterating over the reader yields
+	(time, values) pairs of float hours since the first time stamp and a
+	(chunk rows x wells) array, so the whole export is never held in memory."""
+
+	def __init__(self, f, chunksize=1000, **kwargs):
+		self.chunks = pd.read_csv(f, chunksize=chunksize, **kwargs)
+
 		try:
-			t = time.strptime(t,'%d %H:%M:%S')
-			t = list(t)
-			t[2]+=1
+			self.first = next(self.chunks)
+		except StopIteration:
+			raise ValueError("bioscreen export has no data")
+
+		columns = [c for c in self.first.columns if _well_pattern.match(str(c))]
+		if len(columns) == 0:
+			raise ValueError("bioscreen export has no well columns")
+
+		time = [c for c in self.first.columns if str(c).strip().lower() == 'time']
+		self.timeColumn = time[0] if len(time) > 0 else self.first.columns[0]
+
+		self.columns = columns
+		self.wells = [int(_well_pattern.match(str(c)).group(1)) for c in columns]
+
+	def __iter__(self):
+		t0 = None
+		for chunk in itertools.chain([self.first], self.chunks):
+			seconds = _seconds(chunk[self.timeColumn])
+			if t0 is None:
+				t0 = seconds[0]
 
-			return datetime.datetime(*time.struct_time(t)[:-2])
-		except ValueError, e:
-			raise Exception("Time format unknown")
+			yield (seconds - t0)/3600., chunk[self.columns].values.astype(float)
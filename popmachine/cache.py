@@ -0,0 +1,75 @@
+from collections import OrderedDict
+import threading
+
+def size(ds):
+    """approximate size of a DataSet in bytes."""
+    return ds.data.values.nbytes + ds.meta.memory_usage(index=True, deep=True).sum()
+
+class DataSetCache(object):
+    """A least recently used cache of DataSets bounded by their total size in bytes.
+
+    Entries belong to a generation of the database, the cache is emptied as
+    soon as an entry of a newer generation is requested or stored. Entries of
+    an older generation (computed before a concurrent change) are never
+    stored, nor served. The cache can be shared by threads."""
+
+    def __init__(self, maxbytes=256*1024**2):
+        self.maxbytes = maxbytes
+        self.generation = None
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self, generation=None):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+            self.generation = generation
+
+    def stale(self, generation):
+        """whether generation is older than the one of the cache."""
+        return not self.generation is None and generation < self.generation
+
+    def get(self, key, generation):
+        """the DataSet stored for key, or None."""
+
+        with self.lock:
+            if self.stale(generation):
+                return None
+
+            if generation != self.generation:
+                self.clear(generation)
+                return None
+
+            if not key in self.entries:
+                return None
+
+            ds, n = self.entries.pop(key)
+            self.entries[key] = (ds, n)
+            return ds
+
+    def put(self, key, generation, ds):
+        n = size(ds)
+
+        with self.lock:
+            if self.stale(generation):
+                return
+
+            if generation != self.generation:
+                self.clear(generation)
+
+            if n > self.maxbytes:
+                return
+
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+
+            self.entries[key] = (ds, n)
+            self.bytes += n
+
+            while self.bytes > self.maxbytes:
+                _, (_, m) = self.entries.popitem(last=False)
+                self.bytes -= m
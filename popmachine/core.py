@@ -1,20 +1,119 @@
-from sqlalchemy import MetaData
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import MetaData, Table
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql import select, bindparam
 import models
+from storage import storages
+from plate.summary import summarize_missing
+import logging, threading
+
+def _sqlite_wal(dbapi_connection, connection_record):
+    """use write-ahead logging, readers are not blocked by a writer (and the converse)."""
+
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
 
 class Core(object):
     """A core object, holding necessary references to database (via sqlalchemy)"""
 
-    def __init__(self, db):
-        self.engine = create_engine("sqlite:///%s"%db,echo=False)
-        self.Session = sessionmaker(self.engine)
-        self.session = self.Session()
+    def __init__(self, db, storage='table', poolSize=5):
+
+        # database files are shared by a pool of connections, usable from any
+        # thread, in-memory databases only exist for their single connection
+        if db == ':memory:':
+            self.engine = create_engine("sqlite:///%s"%db,echo=False)
+        else:
+            self.engine = create_engine("sqlite:///%s"%db,echo=False, poolclass=QueuePool, pool_size=poolSize,
+                                        connect_args={'check_same_thread': False})
+            event.listen(self.engine, 'connect', _sqlite_wal)
 
-        models.Base.metadata.create_all(self.engine)
+        # one session per thread, see close
+        self.Session = scoped_session(sessionmaker(self.engine))
+        self.session = self.Session
+
+        # plate data tables are reflected on first access, see table()
         self.metadata = MetaData(self.engine)
-        self.metadata.reflect()
+        self._reflecting = threading.Lock()
+
+        self.storages = dict([(k, s(self)) for k, s in storages.iteritems()])
+        self.storage = self.storages[storage]
+
+        # only create the model tables missing from the schema snapshot
+        self.schema = self.snapshot()
+        missing = [t for t in models.Base.metadata.sorted_tables if not t.name in self.schema]
+        if len(missing) > 0:
+            models.Base.metadata.create_all(self.engine, tables=missing)
+            self.schema = self.snapshot()
+
+        self.migrate([t.name for t in missing])
+
+    def snapshot(self):
+        """names of the tables in the database, excluding plate data tables."""
+
+        res = self.engine.execute("SELECT name FROM sqlite_master WHERE type='table' "\
+                                  "AND name NOT LIKE '\\_plate\\_data\\_%' ESCAPE '\\'")
+        return set([r[0] for r in res])
+
+    def migrate(self, created=[]):
+        """bring a database created by an older version to the current schema,
+        created are the names of the tables just added to it."""
+
+        columns = [r[1] for r in self.engine.execute("PRAGMA table_info(experimental_design)")]
+
+        # numeric shadow column of experimental design values
+        if not 'number' in columns:
+            logging.warning("adding numeric values to experimental designs")
+            ed = models.ExperimentalDesign.__table__
+
+            with self.engine.begin() as conn:
+                conn.execute("ALTER TABLE experimental_design ADD COLUMN number FLOAT")
+
+                rows = [{'_id': i, 'number': models.number(v)} for i, v in conn.execute(select([ed.c.id, ed.c.value]))]
+                if len(rows) > 0:
+                    conn.execute(ed.update().where(ed.c.id==bindparam('_id')).values(number=bindparam('number')), rows)
+
+        # owner of background jobs
+        columns = [r[1] for r in self.engine.execute("PRAGMA table_info(jobs)")]
+        if not 'owner' in columns:
+            logging.warning("adding owners to jobs")
+            self.engine.execute("ALTER TABLE jobs ADD COLUMN owner VARCHAR")
+
+        # summaries of the plates of databases without them
+        if models.PlateSummary.__tablename__ in created:
+            summarize_missing(self)
+
+        # indexes added to existing tables
+        indexes = set([r[0] for r in self.engine.execute("SELECT name FROM sqlite_master WHERE type='index'")])
+        for t in models.Base.metadata.sorted_tables:
+            for index in t.indexes:
+                if not index.name in indexes:
+                    logging.warning("creating index %s"%index.name)
+                    index.create(self.engine)
+
+    def table(self, name):
+        """return the table called name, reflecting it from the database the
+        first time it is accessed."""
+
+        with self._reflecting:
+            if not name in self.metadata.tables:
+                return Table(name, self.metadata, autoload=True)
+            return self.metadata.tables[name]
+
+    def plateStorage(self, plate):
+        """the storage holding the data of plate, defaulting to self.storage."""
+
+        for s in self.storages.values():
+            if s.holds(plate):
+                return s
+        return self.storage
+
+    def remove(self):
+        """close the session of the current thread, a new one is started on next use."""
+        self.Session.remove()
 
     def close(self):
-        self.session.close()
+        self.Session.remove()
         self.engine.dispose()
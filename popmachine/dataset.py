@@ -1,5 +1,6 @@
 import pandas as pd
 import numpy as np
+from collections import OrderedDict
 
 nan_or_zero = lambda x: np.isnan(x) or abs(x) < 1e-9
 
@@ -17,6 +18,36 @@ class DataSet(object):
 
         return cls(data, meta, *args, **kwargs)
 
+    @classmethod
+    def open(cls, dir, mmap_mode='c'):
+        """open a dataset written by save, memory-mapping its data.
+
+        The data matrix is not parsed or copied into memory, pages are read
+        from disk when accessed. The default mode 'c' is copy-on-write: the
+        dataset can be modified in memory without changing the file, use 'r'
+        for a read-only dataset."""
+        import os
+
+        data = np.load(os.path.join(dir, 'data.npy'), mmap_mode=mmap_mode)
+        time = np.load(os.path.join(dir, 'time.npy'))
+        meta = pd.read_pickle(os.path.join(dir, 'meta.pkl'))
+
+        return cls(pd.DataFrame(data, index=time, copy=False), meta)
+
+    def save(self, dir):
+        """write the dataset in a binary format to directory dir, see open.
+
+        The data is stored as a float64 matrix (data.npy), with its time index
+        (time.npy) and metadata (meta.pkl) in side files."""
+        import os
+
+        if not os.path.exists(dir):
+            os.makedirs(dir)
+
+        np.save(os.path.join(dir, 'data.npy'), np.ascontiguousarray(self.data.values, dtype=np.float64))
+        np.save(os.path.join(dir, 'time.npy'), self.data.index.values)
+        self.meta.to_pickle(os.path.join(dir, 'meta.pkl'))
+
     def __init__(self,data,meta=None, timeColumn = 0):
 
         if not type(data) == pd.DataFrame:
@@ -40,8 +71,99 @@ class DataSet(object):
         self.data.columns = self.meta.index
         self.data.index.name='time'
 
+    # Datasets returned by copy, select and subset are views: they keep the
+    # data frame of the dataset they come from (_base) with the rows (a slice)
+    # and columns (positions, None for all) they cover, and only build their
+    # own data frame when data is first accessed. trim narrows a view and log
+    # writes to a new array, so the base is never written to and a chain of
+    # these operations copies the data at most once.
+
+    @property
+    def data(self):
+        if self._data is None:
+            values, index = self._region()
+            self._data = pd.DataFrame(values, index=index, columns=self.meta.index)
+            self._base = self._rows = self._cols = None
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+        self._base = self._rows = self._cols = None
+
+    @property
+    def shape(self):
+        """shape of the data, without building the data frame of a view."""
+        if self._data is None:
+            return (len(xrange(*self._rows.indices(self._base.shape[0]))), self.meta.shape[0])
+        return self._data.shape
+
+    def _region(self, rows=slice(None)):
+        """new array of a view's values, and its time index, rows relative to the view."""
+
+        values = self._base.values[self._rows][rows]
+        if self._cols is None:
+            values = values.copy()
+        else:
+            values = values[:, self._cols]
+
+        return values, self._base.index[self._rows][rows]
+
+    def _view(self, cols=None, meta=None):
+        """a view on the columns (positions) of this dataset."""
+
+        ds = DataSet.__new__(DataSet)
+
+        if self._data is None:
+            ds._base, ds._rows, ds._cols = self._base, self._rows, self._cols
+        else:
+            ds._base, ds._rows, ds._cols = self._data, slice(0, self._data.shape[0]), None
+
+        if not cols is None:
+            cols = np.asarray(cols, dtype=int)
+            ds._cols = cols if ds._cols is None else ds._cols[cols]
+
+        ds._data = None
+        ds.meta = self.meta.copy() if meta is None else meta
+
+        return ds
+
     def copy(self):
-        return DataSet(self.data, self.meta)
+        """a view of the dataset, see data.
+
+        The view shares the data of this dataset until its own data is
+        accessed: values written to this dataset's data before then (e.g.
+        ds.data.iloc[0,0] = 1) show in the copy. Use copy().data to take a
+        snapshot."""
+        return self._view()
+
+    def subset(self, wells):
+        """a view of the wells selected by position or by a boolean mask."""
+
+        wells = np.asarray(wells)
+        if wells.dtype == bool:
+            wells = np.where(wells)[0]
+
+        return self._view(wells, self.meta.iloc[wells])
+
+    def _select(self, **kwargs):
+        """boolean mask of the wells with design=value for each keyword, values
+        are plain values or lists of accepted values. Keywords that are not
+        meta columns are ignored."""
+
+        select = np.ones(self.meta.shape[0], dtype=bool)
+        for k in kwargs.keys():
+            if k in self.meta:
+                if type(kwargs[k]) == list:
+                    select = select & self.meta[k].isin(kwargs[k]).values
+                else:
+                    select = select & (self.meta[k] == kwargs[k]).values
+
+        return select
+
+    def select(self, **kwargs):
+        """a view of the wells matching the keywords, see _select."""
+        return self.subset(self._select(**kwargs))
 
     def __eq__(self,other):
         if not type(other) == DataSet:
@@ -50,32 +172,55 @@ class DataSet(object):
         if any([x not in self.meta.columns for x in other.meta.columns]):
             return False
 
-        if not other.data.shape == self.data.shape or not other.meta.shape == self.meta.shape:
+        if not other.shape == self.shape or not other.meta.shape == self.meta.shape:
             return False
 
-        other = other.copy()
-        other.meta = other.meta[self.meta.columns]
-
         # return ((self.data-other.data).applymap(nan_or_zero)).all().all() and (self.meta == other.meta).all().all()
-        return self.data.equals(other.data) and self.meta.equals(other.meta)#(self.meta == other.meta).all().all()
+        return self.data.equals(other.data) and self.meta.equals(other.meta[self.meta.columns])#(self.meta == other.meta).all().all()
 
     def __repr__(self,):
-        return 'Dataset: %d x %d, %d x %d\n%s\n%s' % (self.data.shape[0], self.data.shape[1], self.meta.shape[0], self.meta.shape[1], str(self.data.head()), str(self.meta.head()))
+        if self._data is None:
+            values, index = self._region(slice(0, 5))
+            head = pd.DataFrame(values, index=index, columns=self.meta.index)
+        else:
+            head = self._data.head()
+
+        return 'Dataset: %d x %d, %d x %d\n%s\n%s' % (self.shape[0], self.shape[1], self.meta.shape[0], self.meta.shape[1], str(head), str(self.meta.head()))
 
     def trim(self, start, stop=None):
-        """remove samples before start and after stop."""
-        if stop is None:
-            stop = self.data.shape[0]
+        """remove samples before start and after stop, returns the dataset.
+
+        A negative start is 0, a negative stop counts from the end as in iloc."""
+
+        start, stop, _ = slice(max(start, 0), stop).indices(self.shape[0])
+        stop = max(start, stop)
+
+        if self._data is None:
+            first = self._rows.indices(self._base.shape[0])[0]
+            self._rows = slice(first + start, first + stop)
+        else:
+            self.data = self.data.iloc[start:stop,:]
 
-        start = max(start, 0)
-        stop = min(stop, self.data.shape[0])
-        self.data = self.data.iloc[start:stop,:]
+        return self
 
     def log(self):
+        """log2 of the data, non-positive values become nan, returns the dataset."""
 
-        self.data[self.data<=0] = np.nan
+        if self._data is None:
+            values, index = self._region()
+            values = out = values.astype(np.float64, copy=False)
+        else:
+            values, index = self._data.values, self._data.index
+            out = np.empty(values.shape)
+
+        with np.errstate(invalid='ignore'):
+            positive = values > 0
 
-        self.data = np.log2(self.data)
+        np.log2(values, out=out, where=positive)
+        out[~positive] = np.nan
+
+        self.data = pd.DataFrame(out, index=index, columns=self.meta.index)
+        return self
 
     def melt(self):
 
@@ -85,25 +230,118 @@ class DataSet(object):
         valuevars = pivot.columns[self.meta.shape[1]:].tolist()
         return pd.melt(pivot, idvars, valuevars, var_name='time', value_name='od')
 
+    def melt_iter(self, chunksize=1000, categorical=True):
+        """melt the dataset in blocks of chunksize wells, yielding tidy data frames.
+
+        Each frame has the meta columns of the block's wells followed by time
+        and od, in the row order melt would give for those wells. Meta columns
+        are categorical by default, with the categories of the whole dataset,
+        so repeated values are stored once and the frames can be concatenated."""
+
+        time = self.data.index.values
+        n = time.shape[0]
+
+        columns = []
+        for c in self.meta.columns:
+            if categorical:
+                codes, categories = pd.factorize(self.meta[c].values)
+                columns.append((c, codes, categories))
+            else:
+                columns.append((c, self.meta[c].values, None))
+
+        for start in range(0, self.meta.shape[0], chunksize):
+            block = slice(start, start + chunksize)
+            values = self.data.values[:, block]
+
+            tidy = OrderedDict()
+            for c, v, categories in columns:
+                if categories is None:
+                    tidy[c] = np.tile(v[block], n)
+                else:
+                    tidy[c] = pd.Categorical.from_codes(np.tile(v[block], n), categories)
+            tidy['time'] = np.repeat(time, values.shape[1])
+            tidy['od'] = values.ravel()
+
+            yield pd.DataFrame(tidy, columns=tidy.keys())
+
+    def melt_csv(self, path_or_buf, chunksize=1000, **kwargs):
+        """write the melted dataset to a csv file, chunksize wells at a time.
+
+        Additional keyword arguments are passed to DataFrame.to_csv."""
+
+        kwargs.setdefault('index', False)
+
+        f = open(path_or_buf, 'w') if isinstance(path_or_buf, basestring) else path_or_buf
+        try:
+            header = True
+            for tidy in self.melt_iter(chunksize):
+                tidy.to_csv(f, header=header, **kwargs)
+                header = False
+        finally:
+            if not f is path_or_buf:
+                f.close()
+
+    def _covariateMatrix(self, covariates):
+        """the (x, covariates) rows and replicate columns of build.
+
+        Equivalent to melting the data to one row per (replicate, time) and
+        pivoting back on (time, covariates) x replicate with a mean, but
+        computed with numpy indexing into the output arrays only. Rows are
+        sorted by time then covariates, columns by replicate, observations
+        with a missing time or covariate are dropped and duplicates are
+        averaged like the pivot did."""
+
+        tcodes, times = pd.factorize(self.data.index.values, sort=True)
+
+        # one code per replicate for the combination of its covariates
+        codes, levels = [], []
+        for c in covariates:
+            code, uniques = pd.factorize(self.meta[c].values, sort=True)
+            codes.append(code)
+            levels.append(np.asarray(uniques).tolist())
+
+        valid = np.ones(self.meta.shape[0], dtype=bool)
+        for code in codes:
+            valid &= code >= 0
+
+        combinations, combo = np.unique(np.ravel_multi_index([code[valid] for code in codes], [len(l) for l in levels]), return_inverse=True)
+        combinations = np.unravel_index(combinations, [len(l) for l in levels])
+        m = len(combinations[0])
+
+        rcodes, reps = pd.factorize(self.meta.index.values[valid], sort=True)
+
+        # accumulate observations in time then replicate order
+        observed = tcodes >= 0
+        values = self.data.values[observed][:, valid].astype(np.float64)
+        rows = tcodes[observed][:, None]*m + combo[None, :]
+        cols = np.repeat(rcodes[None, :], values.shape[0], 0)
+
+        shape = (len(times)*m, len(reps))
+        present = ~np.isnan(values)
+        index = rows[present]*shape[1] + cols[present]
+        y = np.bincount(index, values[present], shape[0]*shape[1]).astype(np.float64, copy=False).reshape(shape)
+        counts = np.bincount(index, None, shape[0]*shape[1]).reshape(shape)
+
+        # mean of the observations, missing where there are none
+        with np.errstate(invalid='ignore', divide='ignore'):
+            y /= counts
+        y[counts == 0] = np.nan
+
+        times = np.asarray(times).tolist()
+        keys = [(t,) + tuple(levels[k][combinations[k][j]] for k in range(len(codes))) \
+                    for t in times for j in range(m)]
+
+        x = pd.DataFrame(np.array(keys),columns=['x']+covariates).values
+
+        return x, y
+
     def build(self,effects=[],covariates=[],scale=None,**kwargs):
 
         if 'x' in covariates:
             covariates.remove('x')
 
         if len(covariates)>0:
-            temp = pd.concat((self.meta,self.data.T),1)
-            temp['rep'] = temp.index
-
-            tidy = pd.melt(temp,self.meta.columns.tolist()+['rep'],
-                            self.data.index.tolist(),
-                            var_name='x',value_name='y')
-
-            pivot = pd.pivot_table(tidy,values='y',
-                            index=['x']+covariates,
-                            columns=['rep'])
-
-            x = pd.DataFrame(np.array(pivot.index.tolist()),columns=['x']+covariates).values
-            y = pivot.values
+            x, y = self._covariateMatrix(covariates)
 
         else:
             x = pd.DataFrame(self.data.index.values,columns=['x']).values
@@ -112,13 +350,7 @@ class DataSet(object):
         effect = self.meta[effects]
         labels = []
 
-        select = [True]*self.meta.shape[0]
-        for k in kwargs.keys():
-            if k in self.meta:
-                if type(kwargs[k]) == list:
-                    select = (select) & (self.meta[k].apply(lambda x: x in kwargs[k]))
-                else:
-                    select = (select) & (self.meta[k] == kwargs[k])
+        select = self._select(**kwargs)
         y = y[:,np.where(select)[0]]
         effect = effect.loc[select,:]
 
@@ -0,0 +1,49 @@
+import warnings
+import numpy as np
+
+def lttb(x, y, points):
+    """indices of the points of each column of y kept by largest triangle three buckets.
+
+    x is sorted, y is (len(x) x curves). The first and last points are
+    always kept, the others are split into points-2 buckets and from each
+    bucket the point making the largest triangle with the point kept in the
+    previous bucket and the average of the next bucket is kept. Curves are
+    downsampled together, one bucket at a time. Returns a (points x curves)
+    array of row indices, all rows if there are no more than points."""
+
+    y = np.asarray(y, dtype=float)
+    if y.ndim == 1:
+        y = y[:,None]
+    n, p = y.shape
+
+    if points >= n or points < 3:
+        return np.repeat(np.arange(n)[:,None], p, 1)
+
+    x = np.asarray(x, dtype=float)
+    columns = np.arange(p)
+
+    index = np.empty((points, p), dtype=int)
+    index[0] = 0
+    index[-1] = n - 1
+
+    previous = np.zeros(p, dtype=int)
+    for i in range(points - 2):
+        start = i*(n-2)//(points-2) + 1
+        end = (i+1)*(n-2)//(points-2) + 1
+        after = min((i+2)*(n-2)//(points-2) + 1, n)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            nextx = x[end:after].mean()
+            nexty = np.nanmean(y[end:after], 0)
+
+        px, py = x[previous], y[previous, columns]
+
+        with np.errstate(invalid='ignore'):
+            area = np.abs((px - nextx)*(y[start:end] - py) - (px - x[start:end,None])*(nexty - py))
+        area[np.isnan(area)] = -1
+
+        previous = start + area.argmax(0)
+        index[i+1] = previous
+
+    return index
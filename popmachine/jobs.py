@@ -0,0 +1,128 @@
+from models import Job
+from sqlalchemy.sql import select
+from multiprocessing.pool import ThreadPool
+import logging, os, datetime, errno, socket
+import pandas as pd
+
+def _alive(pid):
+    """whether process pid runs on this host."""
+    try:
+        os.kill(pid, 0)
+    except OSError, e:
+        return e.errno == errno.EPERM
+    return True
+
+class JobQueue(object):
+    """Run functions in a pool of background threads, keeping their status in the jobs table.
+
+    submit returns the id of the job immediately, status reads its current
+    status, progress and message. Jobs report their progress through the
+    function passed as their first argument, progress(fraction, message=None).
+    Each worker thread uses its own session (see Core), removed at the end of
+    each job.
+
+    Jobs are owned by the process (host:pid) that submitted them. Several
+    processes, e.g. server workers, can share the jobs table: a new queue
+    only fails the unfinished jobs of processes of its host that are gone."""
+
+    def __init__(self, core, workers=2):
+        self.core = core
+        self.table = Job.__table__
+        self.host = socket.gethostname()
+        self.owner = '%s:%d' % (self.host, os.getpid())
+
+        self.interrupt()
+
+        self.pool = ThreadPool(workers)
+
+    def orphan(self, owner):
+        """whether a job of owner will never finish, its process being gone."""
+
+        if owner is None:
+            return True
+
+        host, pid = owner.rsplit(':', 1)
+        return host == self.host and not _alive(int(pid))
+
+    def interrupt(self):
+        """fail the unfinished jobs of processes that are gone."""
+
+        rows = self.core.engine.execute(select([self.table.c.id, self.table.c.owner])\
+                        .where(self.table.c.status.in_(['queued', 'running'])))
+        ids = [id for id, owner in rows if self.orphan(owner)]
+
+        if len(ids) > 0:
+            self.core.engine.execute(self.table.update()\
+                            .where(self.table.c.id.in_(ids))\
+                            .values(status='failed', message='interrupted', updated=datetime.datetime.now()))
+
+    def submit(self, kind, plate, func, *args, **kwargs):
+        res = self.core.engine.execute(self.table.insert().values(kind=kind, plate=plate, owner=self.owner, status='queued', progress=0.))
+        id = res.inserted_primary_key[0]
+
+        self.pool.apply_async(self._run, (id, func, args, kwargs))
+        return id
+
+    def _run(self, id, func, args, kwargs):
+        try:
+            self.update(id, status='running')
+            func(lambda progress, message=None: self.update(id, progress=progress, message=message), *args, **kwargs)
+            self.update(id, status='done', progress=1., message=None)
+        except Exception, e:
+            logging.exception("job %d failed"%id)
+            self.core.session.rollback()
+            self.update(id, status='failed', message=str(e))
+        finally:
+            self.core.remove()
+
+    def update(self, id, **kwargs):
+        """change the columns of job id, outside of any session."""
+        kwargs['updated'] = datetime.datetime.now()
+        self.core.engine.execute(self.table.update().where(self.table.c.id==id).values(**kwargs))
+
+    def status(self, id):
+        """the job's columns as a dictionary, None if there is no such job."""
+
+        row = self.core.engine.execute(select([self.table]).where(self.table.c.id==id)).first()
+        if row is None:
+            return None
+
+        status = dict(row.items())
+        for k in ['created', 'updated']:
+            if not status[k] is None:
+                status[k] = status[k].isoformat()
+        return status
+
+    def close(self):
+        """wait for the submitted jobs to finish."""
+        self.pool.close()
+        self.pool.join()
+
+def import_plate(progress, machine, name, data, experimentalDesign=None, source='csv', ignore=[]):
+    """create plate name from the data and design files, which are removed afterwards.
+
+    Run as a job by the web application, source is csv or bioscreen and the
+    design columns in ignore are dropped."""
+
+    try:
+        progress(0., 'reading design')
+        meta = None
+        if not experimentalDesign is None:
+            meta = pd.read_csv(experimentalDesign)
+            for i in ignore:
+                if i in meta:
+                    del meta[i]
+
+        if source == 'csv':
+            progress(.1, 'reading data')
+            frame = pd.read_csv(data)
+
+            progress(.5, 'writing plate')
+            machine.createPlate(name, frame, meta)
+        else:
+            progress(.1, 'writing plate')
+            machine.createBioscreenPlate(name, data, meta)
+    finally:
+        for f in [data, experimentalDesign]:
+            if isinstance(f, basestring) and os.path.isfile(f):
+                os.remove(f)
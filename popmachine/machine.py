@@ -5,13 +5,47 @@ from sqlalchemy.sql import select, false
 from sqlalchemy.orm import aliased
 from sqlalchemy import Column, Float, or_, and_
 import pandas as pd
+import numpy as np
+from collections import OrderedDict
 from plate import create, delete
+from cache import DataSetCache
+from sqlalchemy import event
 import search.query
 
 class Machine(Core):
 
-    def __init__(self, database='.popmachine.db'):
-        Core.__init__(self, database)
+    def __init__(self, database='.popmachine.db', storage='table', cacheSize=256*1024**2):
+        Core.__init__(self, database, storage)
+
+        # results of get are cached until the generation of the database changes
+        self.generation = 0
+        self.cache = DataSetCache(cacheSize)
+        event.listen(self.session, 'after_flush', self._flushed)
+        event.listen(self.session, 'after_commit', self._committed)
+        event.listen(self.session, 'after_rollback', self._rolledback)
+
+    def _flushed(self, session, context):
+        """note that plates, wells or designs were changed through the session.
+
+        The generation is only bumped once the changes are committed (see
+        _committed): bumped earlier, a concurrent reader could cache rows
+        of before the commit under the new generation."""
+
+        changed = session.new | session.dirty | session.deleted
+        if any([isinstance(o, (Plate, Well, Design, ExperimentalDesign)) for o in changed]):
+            session.info['changed'] = True
+
+    def _committed(self, session):
+        if session.info.pop('changed', False):
+            self.touch()
+
+    def _rolledback(self, session):
+        session.info.pop('changed', None)
+
+    def touch(self):
+        """mark the database as changed, invalidating cached results."""
+        with self.cache.lock:
+            self.generation += 1
 
     def list(self, table):
 
@@ -41,65 +75,152 @@ class Machine(Core):
         po = create.PlateCreate(self, *args, **kwargs)
         ret = po.run()
         self.session.commit()
+        self.touch()
+        return ret
+
+    def createBioscreenPlate(self, *args, **kwargs):
+        po = create.BioscreenPlateCreate(self, *args, **kwargs)
+        ret = po.run()
+        self.session.commit()
+        self.touch()
         return ret
 
     def deletePlate(self, plate, *args, **kwargs):
         pd = delete.PlateDelete(self, plate, *args, **kwargs)
         ret = pd.run()
         self.session.commit()
+        self.touch()
 
         return ret
 
     def get(self, wells, include=[]):
-        """Given a query on wells, return a dataset with the wells's data."""
+        """Given a query on wells, return a dataset with the wells's data.
+
+        Datasets are cached by the query's SQL and parameters and include, a
+        view (see DataSet.copy) of the cached dataset is returned."""
+
+        compiled = wells.statement.compile(self.engine)
+        key = (unicode(compiled), tuple(sorted(compiled.params.items())), tuple(sorted(include)))
+
+        # the generation the query runs against, a change committed meanwhile
+        # by another thread makes the result stale
+        generation = self.generation
+
+        ds = self.cache.get(key, generation)
+        if not ds is None:
+            return ds.copy()
+
+        ds = self._get(wells, include)
+        if not ds is None:
+            self.cache.put(key, generation, ds)
+            ds = ds.copy()
+
+        return ds
+
+    def _get(self, wells, include=[]):
 
         if wells.count()==0:
             return None
 
+        designs = self._designs(include)
+        ids = wells.with_entities(Well.id).subquery()
+        wells = wells.all()
+
+        data = self._data(wells)
+        meta = self._meta(wells, designs, ids)
+
+        return DataSet(data, meta)
+
+    def get_iter(self, wells, include=[], chunksize=None):
+        """Given a query on wells, yield datasets of the wells's data one plate
+        at a time, or in chunks of at most chunksize wells of a plate.
+
+        Every chunk has the same meta columns, only the wells of the current
+        chunk are held in memory."""
+
+        designs = self._designs(include)
+        wells = wells.all()
+
+        plates = OrderedDict()
+        for w in wells:
+            plates.setdefault(w.plate_id, []).append(w)
+
+        for pw in plates.values():
+            step = len(pw) if chunksize is None else chunksize
+            for i in range(0, len(pw), step):
+                chunk = pw[i:i+step]
+                yield DataSet(self._data(chunk), self._meta(chunk, designs, [w.id for w in chunk]))
+
+    def _designs(self, include):
+        """the designs named in include."""
+
         designs = self.session.query(Design)
         if len(include) > 0:
             designs = designs.filter(Design.name.in_(include))
         else:
             designs = designs.filter(false())
+        return designs.all()
 
-        metacols = [d.name for d in designs]
+    def _data(self, wells):
+        """Build the data frame for a list of wells, one column per well.
 
-        meta = data = None
+        Wells are grouped by plate so that each plate's data table is only
+        queried once. Plates are then aligned on time, with times ordered by
+        their first appearance (matching a chain of outer merges on time)."""
 
-        for w in wells:
-            cols = [Column('time', Float), Column(str(w.plate_number), Float)]
-            table = self.metadata.tables[w.plate.data_table]
-            s = select(cols,from_obj=table)
-            res = self.engine.execute(s)
-
-            newdata = pd.DataFrame(list(res), columns = ['time', "%d_%d"%(w.plate.id,w.plate_number)])
-            if data is None:
-                data = newdata
-            else:
-                data = pd.merge(data,newdata,on='time', how='outer')
-
-            newmeta = [w.plate.name, w.plate_number]
-            for d in designs:
-                ed = self.session.query(ExperimentalDesign).filter(\
-                                             ExperimentalDesign.design==d,\
-                                             ExperimentalDesign.wells.contains(w)).one_or_none()
-
-                if not ed is None:
-                    newmeta.append(ed.get_value())
-                else:
-                    newmeta.append(None)
-            newmeta = pd.DataFrame([newmeta], columns = ['plate', 'number']+[d.name for d in designs])
-
-            if meta is None:
-                meta = newmeta
-            else:
-                meta = pd.concat((meta, newmeta),ignore_index=True)
-
-        data.index = data.time
-        del data['time']
-        data = data.astype(float)
+        plates = OrderedDict()
+        for i, w in enumerate(wells):
+            plates.setdefault(w.plate, []).append(i)
 
-        return DataSet(data, meta)
+        frames = []
+        for p, ind in plates.iteritems():
+            frames.append((ind, self.plateStorage(p).read(p, [wells[i].plate_number for i in ind])))
+
+        time = pd.Index(pd.unique(np.concatenate([f.index.values for _, f in frames])), name='time')
+
+        values = np.full((time.shape[0], len(wells)), np.nan)
+        for ind, f in frames:
+            rows = time.get_indexer(f.index)
+            values[rows[:,None], ind] = f.values
+
+        return pd.DataFrame(values, index=time)
+
+    def designValues(self, designs, ids):
+        """query (well id, design name, value) of the provided design ids for
+        the well ids selected by ids."""
+
+        return self.session.query(well_experimental_design.c.well_id, Design.name, ExperimentalDesign.value)\
+                    .join(ExperimentalDesign, ExperimentalDesign.id==well_experimental_design.c.ed_id)\
+                    .join(Design, Design.id==ExperimentalDesign.design_id)\
+                    .filter(Design.id.in_(designs))\
+                    .filter(well_experimental_design.c.well_id.in_(ids))
+
+    def _meta(self, wells, designs, ids):
+        """Build the meta frame for a list of wells with a column for each design.
+
+        The design values of all wells are selected in one joined query
+        (restricted to ids, a list or a query of well ids) and pivoted into
+        columns, missing values are None."""
+
+        meta = pd.DataFrame(OrderedDict([('plate', [w.plate.name for w in wells]),
+                                         ('number', [w.plate_number for w in wells])]))
+
+        if len(designs) == 0:
+            return meta
+
+        q = self.designValues([d.id for d in designs], ids)
+
+        values = pd.DataFrame(q.all(), columns=['well', 'design', 'value'])
+        values = values.drop_duplicates(['well', 'design'])
+        pivot = values.pivot(index='well', columns='design', values='value')
+        pivot = pivot.reindex(index=[w.id for w in wells], columns=[d.name for d in designs])
+
+        for d in designs:
+            column = [None if pd.isnull(v) else d.value(v) for v in pivot[d.name]]
+            missing = any(v is None for v in column)
+            meta[d.name] = pd.Series(column, dtype=object if missing else None)
+
+        return meta
 
     def filter(self, plates=[], numbers=[], *args, **kwargs):
         wells = self.session.query(Well)
@@ -161,6 +282,11 @@ class Machine(Core):
         q = self.filter(plates, numbers, **kwargs)
         return self.get(q, include+kwargs.keys())
 
+    def search_iter(self, plates=[], numbers=[], include=[], chunksize=None, *args, **kwargs):
+        """search like search, yielding the results in chunks (see get_iter)."""
+        q = self.filter(plates, numbers, **kwargs)
+        return self.get_iter(q, include+kwargs.keys(), chunksize)
+
     # def search2(self, plates=[], numbers=[],include=[], *args, **kwargs):
     #     """search the database for wells matching the provided kwargs
     #
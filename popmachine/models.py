@@ -1,32 +1,69 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, Enum, Float
-from sqlalchemy import ForeignKey, UniqueConstraint, Table, PrimaryKeyConstraint
-from sqlalchemy.orm import relationship, backref
+from sqlalchemy import Column, Integer, String, Enum, Float, DateTime
+from sqlalchemy import ForeignKey, UniqueConstraint, Table, PrimaryKeyConstraint, Index
+from sqlalchemy.orm import relationship, backref, validates
 from sqlalchemy import MetaData
+import datetime
 
 Base = declarative_base()
 metadata = MetaData()
 
+def number(value):
+	"""the numeric value of a design value, None if it is not a number."""
+	try:
+		value = float(value)
+	except (TypeError, ValueError):
+		return None
+
+	if value != value:
+		return None
+	return value
+
 class Plate(Base):
 	__tablename__ = "plates"
 	id = Column(Integer, primary_key=True)
-	name = Column(String)
+	name = Column(String, index=True)
 	data_table = Column(String)
 	wells = relationship("Well",back_populates="plate", cascade="all, delete, delete-orphan")
+	summary = relationship("PlateSummary", uselist=False, back_populates="plate", lazy='joined', cascade="all, delete, delete-orphan")
 
 	def __repr__(self):
-		return "%s (%d)" % (self.name, len(self.wells))
+		if self.summary is None:
+			return self.name
+		return "%s (%d)" % (self.name, self.summary.wells)
+
+class PlateSummary(Base):
+	"""counts of a plate, kept up to date by plate.summary.summarize so
+	listing plates does not load their wells."""
+	__tablename__ = "plate_summaries"
+	plate_id = Column(Integer, ForeignKey('plates.id'), primary_key=True)
+	plate = relationship("Plate", back_populates="summary")
+	wells = Column(Integer)
+	timepoints = Column(Integer)
+	time_min = Column(Float)
+	time_max = Column(Float)
+	values = relationship("PlateDesignValue", back_populates="summary", cascade="all, delete, delete-orphan")
+
+class PlateDesignValue(Base):
+	"""the number of wells of a plate with an experimental design."""
+	__tablename__ = "plate_design_values"
+	plate_id = Column(Integer, ForeignKey('plate_summaries.plate_id'), primary_key=True)
+	ed_id = Column(Integer, ForeignKey('experimental_design.id'), primary_key=True)
+	summary = relationship("PlateSummary", back_populates="values")
+	experimentalDesign = relationship("ExperimentalDesign")
+	count = Column(Integer)
 
 well_experimental_design = Table('well_experimental_design', Base.metadata,
     Column('well_id', Integer, ForeignKey('wells.id')),
     Column('ed_id', Integer, ForeignKey('experimental_design.id')),
-	PrimaryKeyConstraint('well_id', 'ed_id')
+	PrimaryKeyConstraint('well_id', 'ed_id'),
+	Index('ix_well_experimental_design_ed_id', 'ed_id'),
 )
 
 class Well(Base):
 	__tablename__ = "wells"
 	id = Column(Integer, primary_key=True)
-	plate_id = Column(Integer, ForeignKey('plates.id'))
+	plate_id = Column(Integer, ForeignKey('plates.id'), index=True)
 	plate = relationship("Plate", back_populates="wells")
 	plate_number = Column(Integer)
 	# design_values = relationship("ExperimentalDesign",back_populates="well")
@@ -39,6 +76,16 @@ class Well(Base):
 	def __repr__(self):
 		return "%d, %s" % (self.plate_number,self.plate.name)
 
+# measurements of all plates in long format, used by storage.LongStorage
+plate_data = Table('plate_data', Base.metadata,
+	Column('id', Integer, primary_key=True),
+	Column('plate_id', Integer, ForeignKey('plates.id')),
+	Column('well_number', Integer),
+	Column('time', Float),
+	Column('od', Float),
+	Index('ix_plate_data_plate_well', 'plate_id', 'well_number'),
+)
+
 class Design(Base):
 	__tablename__ = "designs"
 	id = Column(Integer, primary_key=True)
@@ -68,6 +115,8 @@ class ExperimentalDesign(Base):
 	# well_id = Column(Integer,ForeignKey("wells.id"))
 	# well = relationship("Well",back_populates="design_values")
 	value = Column(String)
+	# numeric shadow of value, so int and float designs compare natively
+	number = Column(Float)
 
 	wells = relationship(
         "Well",
@@ -77,6 +126,15 @@ class ExperimentalDesign(Base):
 
 	# each well should only have one value of any single design
 	# __table_args__ = (UniqueConstraint('well_id','design_id', name='_well_design_uc'),)
+	__table_args__ = (
+		Index('ix_experimental_design_value', 'design_id', 'value'),
+		Index('ix_experimental_design_number', 'design_id', 'number'),
+	)
+
+	@validates('value')
+	def validate_value(self, key, value):
+		self.number = number(value)
+		return value
 
 	def get_value(self):
 		return self.design.value(self.value)
@@ -84,7 +142,22 @@ class ExperimentalDesign(Base):
 	def __repr__(self):
 		return "%s(%s)" % (self.design.name, self.value)
 
+class Job(Base):
+	"""a background job, see jobs.JobQueue."""
+	__tablename__ = "jobs"
+	id = Column(Integer, primary_key=True)
+	kind = Column(String)
+	plate = Column(String)
+	status = Column(Enum('queued', 'running', 'done', 'failed'), default='queued')
+	progress = Column(Float, default=0.)
+	message = Column(String)
+	# host:pid of the process running the job
+	owner = Column(String)
+	created = Column(DateTime, default=datetime.datetime.now)
+	updated = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
 
+	def __repr__(self):
+		return "%s %d (%s)" % (self.kind, self.id, self.status)
 
 # class Parent(Base):
 #     __tablename__ = 'left'
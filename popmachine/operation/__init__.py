@@ -3,5 +3,6 @@ from plate_create import PlateCreate
 from plate_delete import PlateDelete
 from design import DesignList, DesignSetType
 from search import SearchOperation
-from imp import Import
+from imp import Import, BatchImport
+from db import DatabaseAnalyze
 # from server import ServerOperation
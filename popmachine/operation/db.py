@@ -0,0 +1,55 @@
+from operation import Operation
+from ..models import Plate, Well, Design, ExperimentalDesign, well_experimental_design
+from ..search import Between
+
+class DatabaseAnalyze(Operation):
+    """Run EXPLAIN QUERY PLAN on the canonical search queries and report the
+    full table scans they need."""
+
+    def __init__(self, core):
+        Operation.__init__(self, core)
+
+        design = self.core.session.query(Design).first()
+        name = 'design' if design is None else design.name
+
+        wells = self.core.filter(plates=['plate'])
+        ids = wells.with_entities(Well.id).subquery()
+
+        self.queries = [
+            ('plate', self.core.session.query(Plate).filter(Plate.name=='plate')),
+            ('filter plates', wells),
+            ('filter design', self.core.filter(**{name: 'value'})),
+            ('filter design list', self.core.filter(**{name: ['value', 'other']})),
+            ('filter design range', self.core.filter(**{name: Between(0, 1)})),
+            ('design values', self.core.designValues([1], ids)),
+            ('design wells', self.core.session.query(Well)\
+                    .join(well_experimental_design)\
+                    .join(ExperimentalDesign)\
+                    .filter(ExperimentalDesign.id==1)),
+        ]
+
+    def plan(self, query):
+        """the rows of the query plan of a query."""
+
+        compiled = query.statement.compile(self.core.engine)
+        params = [compiled.params[k] for k in compiled.positiontup]
+        return self.core.engine.execute("EXPLAIN QUERY PLAN %s"%compiled, params).fetchall()
+
+    def _run(self):
+
+        scans = []
+        for name, query in self.queries:
+            print name
+            for r in self.plan(query):
+                detail = r[-1]
+                full = detail.startswith('SCAN') and not 'INDEX' in detail
+                if full:
+                    scans.append((name, detail))
+                print "  %s %s" % ('*' if full else ' ', detail)
+
+        print
+        print "%d full scans" % len(scans)
+        for name, detail in scans:
+            print "  %s: %s" % (name, detail)
+
+        return scans
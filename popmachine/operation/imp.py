@@ -1,6 +1,7 @@
 from operation import Operation
 
-import logging, os
+import logging, os, glob, time
+import multiprocessing
 import pandas as pd
 
 class Import(Operation):
@@ -25,3 +26,97 @@ class Import(Operation):
         self.meta = pd.read_csv(os.path.join(self.directory,self.metafile))
 
         self.core.createPlate(self.name, data=self.data, experimentalDesign=self.meta)
+
+def _read_plate(args):
+    """read the data and design files of a plate directory, run by the worker processes."""
+
+    directory, datafile, metafile = args
+
+    start = time.time()
+    try:
+        data = pd.read_csv(os.path.join(directory, datafile))
+        meta = pd.read_csv(os.path.join(directory, metafile))
+    except Exception, e:
+        return directory, None, None, time.time() - start, str(e)
+
+    return directory, data, meta, time.time() - start, None
+
+class BatchImport(Operation):
+    """Import every plate directory found under a root directory (or matching a glob).
+
+    Plate files are parsed in a pool of processes while this process writes
+    the plates into the database one after the other, as they are parsed. A
+    report of timings and row counts for each plate is printed at the end."""
+
+    argsKwargs = Operation.argsKwargs + [('directory', None), ('data', None), ('experimentalDesign', None), ('processes', None)]
+
+    def __init__(self, core, directory, data='data.csv', experimentalDesign='meta.csv', processes=None, **kwargs):
+        Operation.__init__(self, core)
+
+        self.datafile = data
+        self.metafile = experimentalDesign
+        self.processes = processes
+
+        if any([c in directory for c in '*?[']):
+            candidates = glob.glob(directory)
+        else:
+            candidates = [os.path.join(directory, d) for d in os.listdir(directory)]
+
+        self.directories = []
+        for d in sorted(candidates):
+            if os.path.isfile(os.path.join(d, self.datafile)) and os.path.isfile(os.path.join(d, self.metafile)):
+                self.directories.append(d.rstrip('/'))
+            elif os.path.isdir(d):
+                logging.warning("skipping %s, missing %s or %s"%(d, self.datafile, self.metafile))
+
+        self.report = []
+        self.names = None
+
+    def _write(self, name, data, meta):
+        if name in self.names:
+            return 'exists'
+
+        self.core.createPlate(name, data=data, experimentalDesign=meta)
+        self.names.add(name)
+        return 'created'
+
+    def _run(self):
+
+        jobs = [(d, self.datafile, self.metafile) for d in self.directories]
+        self.names = set(self.core.plates(names=True))
+
+        pool = multiprocessing.Pool(self.processes)
+        try:
+            for directory, data, meta, parse, error in pool.imap_unordered(_read_plate, jobs):
+                # plates are reported by name, whatever their status
+                _, name = os.path.split(directory)
+
+                if not error is None:
+                    logging.error("failed to read %s: %s"%(directory, error))
+                    self.report.append((name, 'failed', parse, 0, 0, 0))
+                    continue
+
+                start = time.time()
+                try:
+                    status = self._write(name, data, meta)
+                except Exception, e:
+                    logging.error("failed to import %s: %s"%(directory, e))
+                    self.core.session.rollback()
+
+                    # remove what was written of the plate
+                    if not name in self.names and name in self.core.plates(names=True):
+                        self.core.deletePlate(name)
+
+                    self.report.append((name, 'failed', parse, time.time() - start, 0, 0))
+                    continue
+
+                self.report.append((name, status, parse, time.time() - start, data.shape[0], meta.shape[0]))
+        finally:
+            pool.close()
+            pool.join()
+
+        print "%-30s %-8s %8s %8s %8s %6s" % ('plate', 'status', 'parse', 'write', 'rows', 'wells')
+        for r in self.report:
+            print "%-30s %-8s %8.2f %8.2f %8d %6d" % r
+
+        return self.report
@@ -1,45 +1,20 @@
-from ..models import Plate, Well, Design, ExperimentalDesign
+from ..models import Plate, Well, Design, ExperimentalDesign, well_experimental_design
 from ..operation import PlateOperation
 from ..dataset import DataSet
+from ..bioscreen import Reader
+from ..storage import create_plate_data_table, copy_plate_data
+from .summary import summarize
 
 from sqlalchemy import Table, Column, Integer, String, Interval, MetaData, ForeignKey, Float, or_, and_
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import select, cast, literal
 
 import logging
-
-def create_plate_data_table(plate, core):
-    """create a data_table for the provided plate, doing nothing if it already exists."""
-
-    if not plate.data_table is None:
-        return core.metadata.tables[plate.data_table]
-
-    well_numbers = [w.plate_number for w in plate.wells]
-
-    cols = [Column('id', Integer, primary_key=True), Column('time', Float)] + \
-        [Column(str(wn), Float) for wn in well_numbers]
-
-    table = Table("_plate_data_%d"%plate.id,core.metadata,*cols)
-
-    # core.metadata.create_all(core.engine)
-    table.create(core.engine)
-
-    plate.data_table = table.name
-    core.session.add(plate)
-    core.session.commit()
-
-    return table
-
-# def copy_plate_dataframe_to_table(data,table,data_columns,column_names):
-#
-# 	conn = engine.connect()
-# 	ins = table.insert()
-#
-# 	# add each row to the table
-# 	for i in range(data.shape[0]):
-# 		newrow = dict([('time',data.iloc[i,0])] + [(cn,data.iloc[i,j]) for cn,j in zip(column_names,data_columns)])
-# 		conn.execute(ins,**newrow)
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
 
 def add_experimental_design(core,design_name,design_value,*args,**kwargs):
     # check if design exists, create if needed
@@ -70,6 +45,106 @@ def add_experimental_design(core,design_name,design_value,*args,**kwargs):
 
     core.session.commit()
 
+    # the design counts of the plates of the wells changed
+    for plate in set([w.plate for w in args if isinstance(w, Well)]):
+        summarize(core, plate)
+    core.session.commit()
+
+def _stored_values(core, values, chunksize=500):
+    """the text each value is stored (and compared) as in ExperimentalDesign.value.
+
+    sqlite converts numeric values bound to the String column to text, so
+    the conversion is left to the database to keep matching identical to a
+    direct comparison against the column."""
+
+    stored = []
+    for i in range(0, len(values), chunksize):
+        chunk = values[i:i+chunksize]
+        stored.extend(core.session.execute(select([cast(literal(v), String) for v in chunk])).fetchone())
+    return stored
+
+def add_experimental_designs(core, wells, meta=None, extra={}, design_types={}):
+    """assign experimental designs to wells in bulk.
+
+    meta holds one row per well and one column per design, extra maps design
+    names to a value assigned to every well. Missing designs and experimental
+    designs are created (designs default to type str unless given in
+    design_types), the well associations are inserted at once and the session
+    is committed once."""
+
+    wells = list(wells)
+
+    columns = []
+    if not meta is None:
+        columns.extend([(c, meta[c].tolist()) for c in meta.columns])
+    columns.extend([(k, [v]*len(wells)) for k, v in extra.iteritems()])
+
+    if len(columns) == 0:
+        return
+
+    # resolve designs, creating missing ones
+    names = list(OrderedDict.fromkeys([c for c, _ in columns]))
+    designs = dict([(d.name, d) for d in core.session.query(Design).filter(Design.name.in_(names))])
+    for n in names:
+        if not n in designs:
+            if not n in design_types:
+                logging.info("design %s does not exist, and no design_type is specified to create a new one. using str as default"%n)
+            designs[n] = Design(name=n, type=design_types.get(n, 'str'))
+            core.session.add(designs[n])
+
+    # unique values of each design, ignoring missing ones
+    uniques = OrderedDict()
+    for c, values in columns:
+        for v in values:
+            if not pd.isnull(v):
+                uniques.setdefault((c, v), None)
+    stored = dict(zip(uniques.keys(), _stored_values(core, [v for _, v in uniques.keys()])))
+
+    # resolve experimental designs, creating missing ones
+    core.session.flush()
+    experimentalDesigns = {}
+    for n in names:
+        values = set([stored[k] for k in uniques.keys() if k[0] == n])
+        if len(values) == 0:
+            continue
+
+        existing = core.session.query(ExperimentalDesign)\
+                        .filter(ExperimentalDesign.design_id==designs[n].id, ExperimentalDesign.value.in_(values))
+        for ed in existing:
+            experimentalDesigns[(n, ed.value)] = ed
+
+    for k in uniques.keys():
+        if not (k[0], stored[k]) in experimentalDesigns:
+            logging.info("ExperimentalDesign %s=%s does not exist, creating one"%(k[0], stored[k]))
+            ed = ExperimentalDesign(design=designs[k[0]], value=stored[k])
+            core.session.add(ed)
+            experimentalDesigns[(k[0], stored[k])] = ed
+    core.session.flush()
+
+    # insert well associations that do not exist yet
+    edIds = dict([(k, experimentalDesigns[(k[0], stored[k])].id) for k in uniques.keys()])
+
+    rows = OrderedDict()
+    for c, values in columns:
+        for w, v in zip(wells, values):
+            if not pd.isnull(v):
+                rows[(w.id, edIds[(c, v)])] = None
+
+    # only the associations of these wells, not those of every plate sharing a value
+    wed = well_experimental_design
+    wellIds = [w.id for w in wells]
+    for i in range(0, len(wellIds), 500):
+        existing = core.session.execute(select([wed.c.well_id, wed.c.ed_id])\
+                            .where(wed.c.well_id.in_(wellIds[i:i+500])))
+        for r in existing:
+            rows.pop(tuple(r), None)
+
+    if len(rows) > 0:
+        core.session.execute(well_experimental_design.insert(),
+                            [{'well_id': w, 'ed_id': e} for w, e in rows.keys()])
+
+    core.session.commit()
+
 class PlateCreate(PlateOperation):
 
     argsKwargs = PlateOperation.argsKwargs + [('dataFile', 'data'), ('experimentalDesignFile', 'experimentalDesign'), ('timeColumn', None)]
@@ -96,6 +171,7 @@ class PlateCreate(PlateOperation):
             self.data = self.data.drop(timeColumn, 1)
 
         self.dataset = DataSet(self.data, self.meta)
+        self.meta = self.dataset.meta
 
     def _run(self):
 
@@ -110,32 +186,57 @@ class PlateCreate(PlateOperation):
         # data_columns = range(self.data.shape[1])
         # data_columns.remove(self.timeColumn)
 
-        wells = [Well(plate=self.plate,plate_number=n) for n in range(self.dataset.data.shape[1])]
+        wells = [Well(plate=self.plate,plate_number=n) for n in range(self.meta.shape[0])]
         self.core.session.add_all(wells)
         self.core.session.commit()
 
-        table = create_plate_data_table(self.plate,self.core)
+        self.core.storage.create(self.plate)
         self.core.session.commit()
 
-        # copy in data
-        conn = self.core.engine.connect()
-        ins = table.insert()
-
-        # add each row to the table
-        for i in range(self.data.shape[0]):
-            # newrow = dict([('time',self.data.iloc[i,0])] + [(str(j),self.data.iloc[i,j]) for j in data_columns])
-            newrow = dict([('time',self.dataset.data.index[i])] + [(str(j),self.dataset.data.iloc[i,j]) for j in range(self.dataset.data.shape[1])])
-            conn.execute(ins,**newrow)
+        # copy in data, in a single transaction
+        with self.core.engine.begin() as conn:
+            self._write(conn)
 
-        # add experimental designs
-        for c in self.dataset.meta.columns:
-            for u in self.dataset.meta[c].unique():
-                select = self.dataset.meta[c] == u
-                temp = [w for w,s in zip(wells, select.tolist()) if s]
-                add_experimental_design(self.core,c,u,*temp)
+        # add experimental designs and extra designs
+        add_experimental_designs(self.core, wells, self.meta, self.extraDesigns)
 
-        # add extra designs
-        for k,v in self.extraDesigns.iteritems():
-            add_experimental_design(self.core,k,v,*wells)
+        summarize(self.core, self.plate)
+        self.core.session.commit()
 
         return self.plate
+
+    def _write(self, conn):
+        """copy the plate's data into storage."""
+        self.core.storage.write(conn, self.plate, self.dataset.data.index.values, self.dataset.data.values)
+
+class BioscreenPlateCreate(PlateCreate):
+    """Create a plate from a Bioscreen C export, without building its DataFrame.
+
+    The export is parsed in chunks of chunksize rows by bioscreen.Reader and
+    each chunk is written straight to the plate storage, all in a single
+    transaction."""
+
+    argsKwargs = PlateOperation.argsKwargs + [('dataFile', 'data'), ('experimentalDesignFile', 'experimentalDesign'), ('chunksize', None)]
+
+    def __init__(self, core, plate, data=None, experimentalDesign=None, dataFile=None, experimentalDesignFile=None, chunksize=1000, **kwargs):
+        PlateOperation.__init__(self, core, plate)
+
+        if data is None:
+            data = dataFile
+        if experimentalDesign is None and not experimentalDesignFile is None:
+            experimentalDesign = pd.read_csv(experimentalDesignFile)
+
+        self.reader = Reader(data, chunksize=chunksize)
+
+        # without a design, keep the bioscreen well numbers (101-300)
+        self.meta = experimentalDesign
+        if self.meta is None:
+            self.meta = pd.DataFrame({'well': self.reader.wells})
+
+        assert len(self.reader.wells) == self.meta.shape[0], 'frames do no match, %d x %d' % (len(self.reader.wells), self.meta.shape[0])
+
+        self.extraDesigns = kwargs
+
+    def _write(self, conn):
+        for time, values in self.reader:
+            self.core.storage.write(conn, self.plate, time, values)
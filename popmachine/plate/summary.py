@@ -0,0 +1,48 @@
+from ..models import Plate, PlateSummary, PlateDesignValue, Well, well_experimental_design
+
+from sqlalchemy import func
+from sqlalchemy.sql import select
+
+import logging
+
+def summarize(core, plate):
+    """(re)compute the summary of a plate: its number of wells, timepoints,
+    time range and the number of wells of each experimental design.
+
+    Everything is counted by the database, wells are not loaded. The caller
+    is responsible for committing the session."""
+
+    wells = core.session.query(func.count(Well.id)).filter(Well.plate_id==plate.id).scalar()
+
+    timepoints, time_min, time_max = 0, None, None
+    if not plate.data_table is None:
+        timepoints, time_min, time_max = core.plateStorage(plate).times(plate)
+
+    wed = well_experimental_design
+    counts = select([wed.c.ed_id, func.count(wed.c.well_id)])\
+                .select_from(wed.join(Well.__table__, Well.id==wed.c.well_id))\
+                .where(Well.plate_id==plate.id)\
+                .group_by(wed.c.ed_id)
+
+    values = [PlateDesignValue(ed_id=e, count=c) for e, c in core.session.execute(counts)]
+
+    # replacing the summary deletes the previous one (delete-orphan)
+    if not plate.summary is None:
+        core.session.delete(plate.summary)
+        core.session.flush()
+
+    plate.summary = PlateSummary(wells=wells, timepoints=timepoints, time_min=time_min, time_max=time_max, values=values)
+    core.session.add(plate)
+
+    return plate.summary
+
+def summarize_missing(core):
+    """summarize the plates without a summary, e.g. of databases created by an older version."""
+
+    plates = core.session.query(Plate).filter(~Plate.summary.has()).all()
+    for p in plates:
+        logging.warning("summarizing plate %s"%p.name)
+        summarize(core, p)
+
+    if len(plates) > 0:
+        core.session.commit()
@@ -0,0 +1 @@
+from predicate import Predicate, Equal, Not, Less, LessEqual, Greater, GreaterEqual, Between
@@ -0,0 +1,76 @@
+from sqlalchemy import and_, not_
+
+class Predicate(object):
+    """A condition on the value of a design, used as a keyword value of
+    Machine.filter and Machine.search, e.g.
+
+        machine.filter(concentration=Between(0.1, 2.0), strain=Not('wt'))
+
+    clause() compiles the condition against a value column: the numeric
+    column of int and float designs, the string column otherwise."""
+
+    def clause(self, column):
+        raise NotImplementedError()
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, ", ".join([repr(a) for a in self.args]))
+
+class Equal(Predicate):
+    """value equal to the provided value, or any value of a provided list."""
+
+    def __init__(self, value):
+        self.value = value
+        self.args = [value]
+
+    def clause(self, column):
+        if isinstance(self.value, list):
+            return column.in_(self.value)
+        return column == self.value
+
+class Not(Equal):
+    """value different from the provided value, and from every value of a provided list."""
+
+    def clause(self, column):
+        return not_(Equal.clause(self, column))
+
+class Less(Predicate):
+
+    def __init__(self, value):
+        self.value = value
+        self.args = [value]
+
+    def clause(self, column):
+        return column < self.value
+
+class LessEqual(Less):
+
+    def clause(self, column):
+        return column <= self.value
+
+class Greater(Less):
+
+    def clause(self, column):
+        return column > self.value
+
+class GreaterEqual(Less):
+
+    def clause(self, column):
+        return column >= self.value
+
+class Between(Predicate):
+    """value between low and high, inclusive."""
+
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+        self.args = [low, high]
+
+    def clause(self, column):
+        return column.between(self.low, self.high)
+
+def predicate(value):
+    """the predicate for a keyword value, plain values and lists test equality."""
+
+    if isinstance(value, Predicate):
+        return value
+    return Equal(value)
@@ -1,47 +1,39 @@
-from sqlalchemy.sql.expression import cast
-from sqlalchemy import String, Integer, Boolean, Float, and_, or_, exists
-from ..models import Design, ExperimentalDesign, Well
-from sqlalchemy.orm import aliased
+from sqlalchemy import and_, false
+from sqlalchemy.sql import select
+from ..models import Design, ExperimentalDesign, Well, well_experimental_design
+from predicate import predicate
 
 def query(wells, **kwargs):
 
-    """Given a query on wells, filter by design=value provided in kwargs."""
+    """Given a query on wells, filter by design=value provided in kwargs.
 
-    for d, v in kwargs.iteritems():
+    Values are either plain values, lists of accepted values or
+    search.predicate.Predicate objects (e.g. Between, Not). Keywords that
+    are not the name of a design are ignored.
 
-        valueAlias = aliased(ExperimentalDesign)
-        designAlias = aliased(Design)
+    Each keyword filters the wells to those in a subquery over the
+    experimental designs of one design, so the (design_id, value) and
+    (design_id, number) indexes of experimental_design can be used."""
 
-        wells = wells.join(valueAlias, Well.experimentalDesigns)
-        wells = wells.join(designAlias, valueAlias.design)
+    for d, v in kwargs.iteritems():
 
-        if isinstance(v, list):
-            # convert non-string values
-            # v = [str(z) for z in v]
+        design = wells.session.query(Design).filter(Design.name==d).one_or_none()
+        if design is None:
+            continue
 
-            wells = wells.filter(or_(
-                                        ~exists().where(designAlias.name==d),
-                                        or_(
-                                            and_(designAlias.name==d, designAlias.type=='str', valueAlias.value.in_(v)),
-                                            and_(designAlias.name==d, designAlias.type=='int', cast(valueAlias.value, Integer).in_(v)),
-                                            and_(designAlias.name==d, designAlias.type=='float', cast(valueAlias.value, Float).in_(v)),
-                                        )
-                                    )
-                                )
+        v = predicate(v)
 
+        if design.type == 'str':
+            clause = v.clause(ExperimentalDesign.value)
+        elif design.type in ['int', 'float']:
+            clause = v.clause(ExperimentalDesign.number)
         else:
-            # convert non-string values
-            # v = str(v)
-
-            wells = wells.filter(or_(
-                                        ~exists().where(designAlias.name==d),
-                                        # and_(designAlias.name==d, valueAlias.value==v)
-                                        or_(
-                                            and_(designAlias.name==d, designAlias.type=='str', valueAlias.value==v),
-                                            and_(designAlias.name==d, designAlias.type=='int', cast(valueAlias.value, Integer)==v),
-                                            and_(designAlias.name==d, designAlias.type=='float', cast(valueAlias.value, Float)==v),
-                                        )
-                                    )
-                                )
+            clause = false()
+
+        matching = select([well_experimental_design.c.well_id])\
+                    .select_from(well_experimental_design.join(ExperimentalDesign, ExperimentalDesign.id==well_experimental_design.c.ed_id))\
+                    .where(and_(ExperimentalDesign.design_id==design.id, clause))
+
+        wells = wells.filter(Well.id.in_(matching))
 
     return wells
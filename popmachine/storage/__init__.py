@@ -0,0 +1,6 @@
+from storage import Storage
+from table import TableStorage, create_plate_data_table, copy_plate_data
+from longformat import LongStorage
+
+# available storage backends, by name
+storages = {'table': TableStorage, 'long': LongStorage}
@@ -0,0 +1,59 @@
+from storage import Storage
+from ..models import plate_data
+
+from sqlalchemy.sql import select, and_, func
+
+import numpy as np
+import pandas as pd
+
+class LongStorage(Storage):
+    """Keep the data of all plates in the single long format table plate_data,
+    with one (plate_id, well_number, time, od) row per measurement."""
+
+    table = plate_data
+
+    def holds(self, plate):
+        return plate.data_table == self.table.name
+
+    def create(self, plate):
+        plate.data_table = self.table.name
+        self.core.session.add(plate)
+        self.core.session.commit()
+
+        return self.table
+
+    def write(self, conn, plate, time, values):
+        values = np.asarray(values, dtype=float)
+        time = np.asarray(time).tolist()
+
+        rows = [{'plate_id': plate.id, 'well_number': j, 'time': t, 'od': v} \
+                    for j in range(values.shape[1]) for t, v in zip(time, values[:,j].tolist())]
+        if len(rows) > 0:
+            conn.execute(self.table.insert(), rows)
+
+    def read(self, plate, numbers):
+        t = self.table
+        s = select([t.c.well_number, t.c.time, t.c.od])\
+                .where(and_(t.c.plate_id==plate.id, t.c.well_number.in_(set(numbers))))\
+                .order_by(t.c.well_number, t.c.id)
+        res = np.array(self.core.engine.execute(s).fetchall(), dtype=float).reshape(-1, 3)
+
+        # rows of each well are consecutive and in the order written
+        wells, counts = np.unique(res[:,0], return_counts=True)
+        n = counts[0] if len(counts) > 0 else 0
+        values = res[:,2].reshape(len(wells), n).T
+
+        data = pd.DataFrame(values[:, np.searchsorted(wells, numbers)], index=res[:n,1])
+        data.index.name = 'time'
+        return data
+
+    def times(self, plate):
+        # every well has the same timepoints, count those of the first one
+        t = self.table
+        first = select([func.min(t.c.well_number)]).where(t.c.plate_id==plate.id).as_scalar()
+        s = select([func.count(t.c.id), func.min(t.c.time), func.max(t.c.time)])\
+                .where(and_(t.c.plate_id==plate.id, t.c.well_number==first))
+        return tuple(self.core.engine.execute(s).fetchone())
+
+    def delete(self, plate):
+        self.core.engine.execute(self.table.delete().where(self.table.c.plate_id==plate.id))
@@ -0,0 +1,35 @@
+class Storage(object):
+    """Storage of the measurements of plates.
+
+    A storage backend keeps the (time x wells) data of a plate, with well
+    columns identified by their plate_number. Plate.data_table records where
+    the data of each plate lives, which holds() checks against."""
+
+    def __init__(self, core):
+        self.core = core
+
+    def holds(self, plate):
+        """whether the data of plate is kept by this storage."""
+        raise NotImplementedError()
+
+    def create(self, plate):
+        """prepare storage for a plate whose wells exist, setting plate.data_table."""
+        raise NotImplementedError()
+
+    def write(self, conn, plate, time, values):
+        """copy an array of values (time x wells) into the plate's storage, on
+        the connection conn. the caller is responsible for the transaction."""
+        raise NotImplementedError()
+
+    def read(self, plate, numbers):
+        """return a frame indexed by time with one column for each well number
+        in numbers (labelled 0..len(numbers)-1), rows in the order written."""
+        raise NotImplementedError()
+
+    def times(self, plate):
+        """the (number, min, max) of the timepoints of a plate."""
+        raise NotImplementedError()
+
+    def delete(self, plate):
+        """remove the data of a plate."""
+        raise NotImplementedError()
@@ -0,0 +1,81 @@
+from storage import Storage
+
+from sqlalchemy import Table, Column, Integer, Float
+from sqlalchemy.sql import select, func
+from sqlalchemy.exc import NoSuchTableError
+
+import logging
+import numpy as np
+import pandas as pd
+
+def create_plate_data_table(plate, core):
+    """create a data_table for the provided plate, doing nothing if it already exists."""
+
+    if not plate.data_table is None:
+        return core.table(plate.data_table)
+
+    well_numbers = [w.plate_number for w in plate.wells]
+
+    cols = [Column('id', Integer, primary_key=True), Column('time', Float)] + \
+        [Column(str(wn), Float) for wn in well_numbers]
+
+    table = Table("_plate_data_%d"%plate.id,core.metadata,*cols)
+
+    # core.metadata.create_all(core.engine)
+    table.create(core.engine)
+
+    plate.data_table = table.name
+    core.session.add(plate)
+    core.session.commit()
+
+    return table
+
+def copy_plate_data(conn, table, time, values):
+    """copy an array of values (time x wells) into a plate's data_table.
+
+    All rows are sent with a single executemany on the provided connection,
+    the caller is responsible for the surrounding transaction."""
+
+    values = np.asarray(values, dtype=float)
+    keys = ['time'] + [str(j) for j in range(values.shape[1])]
+
+    rows = [dict(zip(keys, [t] + r)) for t, r in zip(np.asarray(time).tolist(), values.tolist())]
+    if len(rows) > 0:
+        conn.execute(table.insert(), rows)
+
+class TableStorage(Storage):
+    """Keep each plate's data in its own table, _plate_data_<id>, with a time
+    column and one Float column per well."""
+
+    def holds(self, plate):
+        return not plate.data_table is None and plate.data_table.startswith('_plate_data_')
+
+    def create(self, plate):
+        return create_plate_data_table(plate, self.core)
+
+    def write(self, conn, plate, time, values):
+        copy_plate_data(conn, self.core.table(plate.data_table), time, values)
+
+    def read(self, plate, numbers):
+        table = self.core.table(plate.data_table)
+        cols = [table.c.time] + [table.c[str(n)] for n in numbers]
+        s = select(cols).order_by(table.c.id)
+        res = self.core.engine.execute(s).fetchall()
+
+        data = pd.DataFrame.from_records(res, columns=['time']+range(len(numbers)), coerce_float=True)
+        return data.set_index('time').astype(float)
+
+    def times(self, plate):
+        table = self.core.table(plate.data_table)
+        s = select([func.count(table.c.id), func.min(table.c.time), func.max(table.c.time)])
+        return tuple(self.core.engine.execute(s).fetchone())
+
+    def delete(self, plate):
+        try:
+            table = self.core.table(plate.data_table)
+        except NoSuchTableError:
+            logging.error("plate %s data_table not in database"%plate.name)
+            return
+
+        table.drop(self.core.engine)
+        self.core.metadata.remove(table)
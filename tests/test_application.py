@@ -0,0 +1,151 @@
+from popmachine.search import Not, GreaterEqual, Less
+from popmachine import models
+import numpy as np
+import pandas as pd
+import os, shutil, tempfile, json, urlparse, re
+from io import BytesIO
+from StringIO import StringIO
+
+# the application keeps its database (.popmachine.db) in the working directory
+# it is imported from
+directory = tempfile.mkdtemp()
+cwd = os.getcwd()
+os.chdir(directory)
+try:
+    from popmachine.application.app import app
+    from popmachine.application import views
+finally:
+    os.chdir(cwd)
+
+def setup_module(module):
+    data = pd.DataFrame(np.arange(15.).reshape(3, 5), index=[0., 1., 2.])
+    meta = pd.DataFrame({'strain': ['wt', 'wt', 'mutant', 'wt', 'mutant'], 'temperature': [30, 37, 30, 37, 30]})
+    views.machine.createPlate('a', data=data, experimentalDesign=meta)
+    views.machine.createPlate('b', data=data + 100, experimentalDesign=meta)
+
+def teardown_module(module):
+    views.jobs.close()
+    views.machine.close()
+    shutil.rmtree(directory)
+
+def test_parse_search():
+    parse = views.parse_search
+
+    assert parse("") == {}
+    assert parse("strain=wt") == {'strain': ['wt']}
+    assert parse("strain = wt, mutant ") == {'strain': ['wt', 'mutant']}
+    assert parse("growth medium=LB broth") == {'growth medium': ['LB broth']}
+
+    kwargs = parse("strain!=wt temperature>=30; od<1.5")
+    assert isinstance(kwargs['strain'], Not) and kwargs['strain'].value == ['wt']
+    assert isinstance(kwargs['temperature'], GreaterEqual) and kwargs['temperature'].value == '30'
+    assert isinstance(kwargs['od'], Less) and kwargs['od'].value == '1.5'
+
+    # the range of a second term is not swallowed by the values of the first
+    kwargs = parse("strain=wt,mutant temperature>=30")
+    assert kwargs['strain'] == ['wt', 'mutant']
+    assert isinstance(kwargs['temperature'], GreaterEqual) and kwargs['temperature'].value == '30'
+
+    for text in ["wt", "strain=wt; mutant", "strain=wt &temperature=30", "temperature>=30,37", "strain="]:
+        try:
+            parse(text)
+        except ValueError:
+            continue
+        assert False, text
+
+def test_api_search_json():
+    client = app.test_client()
+
+    res = client.get('/api/search/?search=strain%3Dwt&include=temperature')
+    assert res.status_code == 200
+    assert res.headers['X-Total-Count'] == '6'
+    assert not 'Link' in res.headers
+
+    body = json.loads(res.data)
+    assert body['total'] == 6 and body['next'] is None
+    assert [w['meta']['strain'] for w in body['wells']] == ['wt']*6
+    assert body['wells'][0]['time'] == [0., 1., 2.]
+    assert body['wells'][0]['od'] == [0., 5., 10.]
+    assert body['wells'][-1]['od'] == [103., 108., 113.]
+
+def test_api_search_pages():
+    client = app.test_client()
+
+    wells, url = [], '/api/search/?plates=a,b&limit=4&chunksize=3'
+    while not url is None:
+        res = client.get(url)
+        assert res.headers['X-Total-Count'] == '10'
+
+        wells.extend([w['od'][0] for w in json.loads(res.data)['wells']])
+
+        url = None
+        if 'Link' in res.headers:
+            link = res.headers['Link']
+            assert link.endswith('; rel="next"')
+            url = link[1:link.index('>')]
+            assert urlparse.parse_qs(urlparse.urlparse(url).query)['limit'] == ['4']
+
+    assert wells == [0., 1., 2., 3., 4., 100., 101., 102., 103., 104.]
+
+def test_api_search_csv():
+    res = app.test_client().get('/api/search/?search=strain%3Dmutant&plates=a&format=csv&chunksize=1')
+    assert res.status_code == 200
+    assert res.headers['X-Total-Count'] == '2'
+
+    tidy = pd.read_csv(StringIO(res.data))
+    assert tidy.shape[0] == 6
+    assert (tidy.strain == 'mutant').all()
+    assert sorted(tidy.od.tolist()) == [2., 4., 7., 9., 12., 14.]
+
+def test_api_search_npz():
+    res = app.test_client().get('/api/search/?search=temperature%3E%3D35&format=npz')
+    assert res.status_code == 200
+    assert res.headers['X-Total-Count'] == '4'
+
+    arrays = np.load(BytesIO(res.data))
+    assert arrays['time'].tolist() == [0., 1., 2.]
+    assert arrays['data'].shape == (3, 4)
+    assert arrays['data'][0].tolist() == [1., 3., 101., 103.]
+    assert arrays['meta_temperature'].tolist() == ['37']*4
+
+def test_api_search_rejects_unparsed_text():
+    client = app.test_client()
+
+    res = client.get('/api/search/?search=strain%3Dwt%20%26temperature%3D30')
+    assert res.status_code == 400
+    assert 'cannot parse' in json.loads(res.data)['error']
+
+    assert client.get('/api/search/?search=strain%3Dwt&format=xml').status_code == 400
+
+def test_plot_data_of_a_search():
+    client = app.test_client()
+
+    res = client.post('/search/', data={'search': 'strain=wt'})
+    assert res.status_code == 200
+
+    url = re.search('/plot-data/[0-9a-f]+', res.data).group(0)
+
+    # the full resolution data is fetched again through the machine's cache
+    cached = len(views.machine.cache)
+    body = json.loads(client.get(url + '?start=0.5&end=1.5').data)
+    assert len(body['xs']) == 6 and body['xs'][0] == [0., 1., 2.]
+    assert len(views.machine.cache) == cached
+
+    # a window without samples
+    body = json.loads(client.get(url + '?start=1.2&end=1.8').data)
+    assert body['xs'][0] == [1., 2.]
+
+    assert client.get('/plot-data/missing').status_code == 404
+
+def test_plot_data_of_designs():
+    client = app.test_client()
+
+    design = views.machine.session.query(models.Design).filter(models.Design.name=='strain').one()
+    ed = [v for v in design.values if v.value == 'mutant'][0]
+
+    for page, wells in [('/design/%d/a' % design.id, 5), ('/experimentaldesign/%d' % ed.id, 4), ('/experimentaldesign/%d/b' % ed.id, 2)]:
+        res = client.get(page)
+        assert res.status_code == 200
+
+        url = re.search('/plot-data/[0-9a-f]+', res.data).group(0)
+        assert len(json.loads(client.get(url).data)['xs']) == wells
@@ -0,0 +1,54 @@
+from hypothesis import given
+import hypothesis.strategies as st
+import pandas as pd
+import numpy as np
+
+from popmachine import bioscreen, Machine
+from StringIO import StringIO
+
+def stamp(seconds):
+    d, s = divmod(seconds, 86400)
+    stamp = "%02d:%02d:%02d" % (s/3600, s%3600/60, s%60)
+    if d > 0:
+        stamp = "%d %s" % (d, stamp)
+    return stamp
+
+@given(st.lists(st.integers(min_value=0, max_value=100*86400), min_size=1))
+def test_convert_time(seconds):
+    time = bioscreen.convert_time(pd.Series([stamp(s) for s in seconds]))
+
+    assert np.allclose(time.values, (np.array(seconds) - seconds[0])/3600.)
+
+@given(st.lists(st.integers(min_value=0, max_value=86400), min_size=1),\
+        st.text(min_size=1).filter(lambda x: not any([c.isdigit() for c in x])))
+def test_convert_time_unknown_format(seconds, garbage):
+    stamps = [stamp(s) for s in seconds] + [garbage]
+
+    try:
+        bioscreen.convert_time(pd.Series(stamps))
+        assert False
+    except Exception, e:
+        assert str(e) == "Time format unknown"
+
+@given(st.lists(st.integers(min_value=0, max_value=10*86400), min_size=1, max_size=30, unique=True),\
+        st.integers(min_value=1, max_value=5), st.integers(min_value=1, max_value=7))
+def test_bioscreen_plate_create(seconds, nwells, chunksize):
+    seconds = sorted(seconds)
+    values = np.random.rand(len(seconds), nwells)
+
+    export = pd.DataFrame(values, columns=['Well %d' % (101+i) for i in range(nwells)])
+    export.insert(0, 'Time', [stamp(s) for s in seconds])
+    export['Blank'] = 0
+
+    f = StringIO()
+    export.to_csv(f, index=False)
+    f.seek(0)
+
+    machine = Machine(':memory:')
+    machine.createBioscreenPlate('plate', f, chunksize=chunksize)
+
+    ds = machine.search(plates=['plate'], include=['well'])
+    assert ds.data.shape == values.shape
+    assert np.allclose(ds.data.values, values)
+    assert np.allclose(ds.data.index.values, (np.array(seconds) - seconds[0])/3600.)
+    assert ds.meta.well.astype(int).tolist() == range(101, 101+nwells)
@@ -1,6 +1,11 @@
 from dataset.fullfactorial import fullfactorialDataset
 from hypothesis import given, settings
+import hypothesis.strategies as st
 from popmachine import DataSet
+import numpy as np
+import pandas as pd
+import shutil, tempfile
+from StringIO import StringIO
 
 @given(fullfactorialDataset)
 def test_dataset_equality(ds):
@@ -21,3 +26,137 @@ def test_dataset_copy(ds):
 
     assert ds == ds2
     assert ds2 == ds
+
+@given(fullfactorialDataset)
+def test_dataset_save_and_open(ds):
+
+    directory = tempfile.mkdtemp()
+    try:
+        ds.save(directory)
+        ds2 = DataSet.open(directory)
+
+        assert ds == ds2
+        assert ds2 == ds
+    finally:
+        shutil.rmtree(directory)
+
+def build_pivot(ds, covariates):
+    """the melt and pivot_table implementation of build with covariates."""
+
+    temp = pd.concat((ds.meta,ds.data.T),1)
+    temp['rep'] = temp.index
+
+    tidy = pd.melt(temp,ds.meta.columns.tolist()+['rep'],
+                    ds.data.index.tolist(),
+                    var_name='x',value_name='y')
+
+    pivot = pd.pivot_table(tidy,values='y',
+                    index=['x']+covariates,
+                    columns=['rep'])
+
+    x = pd.DataFrame(np.array(pivot.index.tolist()),columns=['x']+covariates).values
+    return x, pivot.values
+
+@given(fullfactorialDataset, st.data())
+def test_dataset_build_covariates(ds, data):
+
+    covariates = data.draw(st.lists(st.sampled_from(ds.meta.columns.tolist()), min_size=1, unique=True))
+
+    x, y = build_pivot(ds, covariates)
+    x2, y2, _, _ = ds.build(covariates=list(covariates))
+
+    assert x.dtype == x2.dtype
+    assert np.array_equal(x, x2)
+    assert y.shape == y2.shape
+    assert np.array_equal(np.isnan(y), np.isnan(y2))
+    assert np.array_equal(y[~np.isnan(y)].view(np.int64), y2[~np.isnan(y2)].view(np.int64))
+
+@given(fullfactorialDataset, st.data())
+def test_dataset_views(ds, data):
+
+    n, p = ds.data.shape
+    data0, meta0 = ds.data.copy(), ds.meta.copy()
+
+    wells = data.draw(st.lists(st.integers(min_value=0, max_value=p-1), min_size=1))
+    start = data.draw(st.integers(min_value=0, max_value=n))
+    stop = data.draw(st.integers(min_value=start, max_value=n))
+
+    view = ds.subset(wells).trim(start, stop).log()
+
+    expected = data0.iloc[start:stop, wells].copy()
+    expected[expected <= 0] = np.nan
+    expected = np.log2(expected)
+
+    assert view.data.equals(expected)
+    assert view.meta.equals(meta0.iloc[wells])
+
+    eager = DataSet(data0.copy(), meta0).trim(start, stop).log()
+    assert eager.data.iloc[:, wells].equals(expected)
+
+    # the original is never written to
+    assert ds.data.equals(data0)
+    assert ds.meta.equals(meta0)
+
+    copy = ds.copy()
+    copy.data.iloc[:,:] = 0
+    copy.meta[copy.meta.columns[0]] = None
+    assert ds.data.equals(data0)
+    assert ds.meta.equals(meta0)
+
+@given(fullfactorialDataset, st.data())
+def test_dataset_trim_bounds(ds, data):
+    """Test that views and datasets are trimmed alike, for negative and missing bounds."""
+
+    n = ds.data.shape[0]
+    start = data.draw(st.integers(min_value=-n-2, max_value=n+2))
+    stop = data.draw(st.one_of(st.none(), st.integers(min_value=-n-2, max_value=n+2)))
+
+    eager = DataSet(ds.data.copy(), ds.meta.copy()).trim(start, stop)
+    view = ds.copy().trim(start, stop)
+    twice = ds.copy().trim(1).trim(start, stop)
+
+    assert view.shape == eager.shape
+    assert view.data.equals(eager.data)
+    assert twice.data.equals(DataSet(ds.data.iloc[1:].copy(), ds.meta.copy()).trim(start, stop).data)
+
+@given(fullfactorialDataset)
+def test_dataset_select(ds):
+
+    k = ds.meta.columns[0]
+    value = ds.meta[k].iloc[0]
+
+    select = ds.select(**{k: value})
+    assert select == DataSet(ds.data.loc[:, ds.meta[k] == value], ds.meta[ds.meta[k] == value])
+
+    select = ds.select(**{k: [value]})
+    assert (select.meta[k] == value).all()
+
+@given(fullfactorialDataset, st.integers(min_value=1, max_value=10))
+def test_dataset_melt_iter(ds, chunksize):
+
+    tidy = ds.melt()
+    tidy['time'] = tidy['time'].astype(float)
+
+    chunks = list(ds.melt_iter(chunksize))
+    assert len(chunks) == -(-ds.meta.shape[0] // chunksize)
+
+    # a single block is melt
+    single = pd.concat(ds.melt_iter(ds.meta.shape[0]), ignore_index=True)
+    for c in ds.meta.columns:
+        assert single[c].dtype.name == 'category'
+        single[c] = single[c].astype(object)
+    assert single.equals(tidy)
+
+    # blocks hold the same rows
+    chunked = pd.concat(chunks, ignore_index=True)
+    for c in ds.meta.columns:
+        chunked[c] = chunked[c].astype(object)
+
+    columns = tidy.columns.tolist()
+    key = lambda df: df.fillna(0).sort_values(columns).reset_index(drop=True)
+    assert key(chunked).equals(key(tidy))
+
+    f = StringIO()
+    ds.melt_csv(f, chunksize)
+    f.seek(0)
+    assert pd.read_csv(f).shape == tidy.shape
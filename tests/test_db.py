@@ -0,0 +1,91 @@
+import popmachine
+from popmachine.operation import DatabaseAnalyze
+import pandas as pd
+import os, shutil, tempfile, threading
+
+def test_search_queries_use_indexes():
+    """Test that none of the canonical search queries need a full table scan."""
+
+    machine = popmachine.Machine(":memory:")
+    machine.createPlate('plate', data=pd.DataFrame([[0., 1.], [1., 2.]]), experimentalDesign=pd.DataFrame({'strain': ['wt']}))
+
+    assert DatabaseAnalyze(machine).run() == []
+
+def test_threads_use_their_own_sessions():
+    """Test that threads searching a database file each get a session, from a pool of connections in WAL mode."""
+
+    directory = tempfile.mkdtemp()
+    try:
+        machine = popmachine.Machine(os.path.join(directory, 'test.db'))
+        machine.createPlate('plate', data=pd.DataFrame([[0., 1.], [1., 2.]]), experimentalDesign=pd.DataFrame({'strain': ['wt']}))
+        expected = machine.search(strain='wt')
+
+        assert machine.engine.execute("PRAGMA journal_mode").scalar() == 'wal'
+
+        results = {}
+        def search(i):
+            results[i] = (machine.session(), machine.search(strain='wt'), machine.filter(strain='wt').count())
+            machine.remove()
+
+        threads = [threading.Thread(target=search, args=(i,)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(set([id(s) for s, _, _ in results.values()] + [id(machine.session())])) == 5
+        for _, ds, count in results.values():
+            assert ds == expected
+            assert count == 1
+
+        machine.close()
+    finally:
+        shutil.rmtree(directory)
+
+def test_get_does_not_cache_results_of_older_generations():
+    """Test that a search running while another thread creates a plate is not cached for the new generation."""
+
+    directory = tempfile.mkdtemp()
+    try:
+        machine = popmachine.Machine(os.path.join(directory, 'test.db'))
+        data, meta = pd.DataFrame([[0., 1., 2.], [1., 2., 3.]]), pd.DataFrame({'strain': ['wt', 'wt']})
+        machine.createPlate('a', data=data, experimentalDesign=meta)
+
+        # create plate b in another thread while the first search queries the database
+        _get = machine._get
+        def get(*args, **kwargs):
+            ds = _get(*args, **kwargs)
+            if not 'b' in machine.plates(names=True):
+                t = threading.Thread(target=lambda: (machine.createPlate('b', data=data, experimentalDesign=meta), machine.remove()))
+                t.start()
+                t.join()
+            return ds
+        machine._get = get
+
+        assert machine.search(strain='wt').data.shape[1] == 2
+        assert machine.search(strain='wt').data.shape[1] == 4
+
+        machine.close()
+    finally:
+        shutil.rmtree(directory)
+
+def test_generation_bumped_on_commit():
+    """Test that changes flushed through the session change the generation once committed, not before."""
+
+    machine = popmachine.Machine(":memory:")
+    machine.createPlate('plate', data=pd.DataFrame([[0., 1.], [1., 2.]]), experimentalDesign=pd.DataFrame({'strain': ['wt']}))
+
+    generation = machine.generation
+    design = machine.session.query(popmachine.models.Design).first()
+
+    design.description = 'changed'
+    machine.session.flush()
+    assert machine.generation == generation
+    machine.session.commit()
+    assert machine.generation == generation + 1
+
+    design.description = 'rolled back'
+    machine.session.flush()
+    machine.session.rollback()
+    machine.session.commit()
+    assert machine.generation == generation + 1
@@ -0,0 +1,59 @@
+from hypothesis import given
+import hypothesis.strategies as st
+import numpy as np
+import pandas as pd
+
+from popmachine.downsample import lttb
+
+@given(st.integers(min_value=1, max_value=200), st.integers(min_value=1, max_value=5), st.integers(min_value=0, max_value=50))
+def test_lttb(n, p, points):
+    x = np.sort(np.random.rand(n))
+    y = np.random.rand(n, p)
+    y[np.random.rand(n, p) < .1] = np.nan
+
+    index = lttb(x, y, points)
+
+    if points >= n or points < 3:
+        assert index.shape == (n, p)
+    else:
+        assert index.shape == (points, p)
+        assert (index[0] == 0).all() and (index[-1] == n-1).all()
+
+    # one increasing index per bucket
+    assert (np.diff(index, axis=0) > 0).all()
+
+def test_lttb_keeps_peaks():
+    x = np.arange(1000.)
+    y = np.zeros((1000, 2))
+    y[500, 0] = 10
+    y[250, 1] = -10
+
+    index = lttb(x, y, 20)
+    assert 500 in index[:,0]
+    assert 250 in index[:,1]
+
+def test_lttb_without_rows():
+    assert lttb(np.zeros(0), np.zeros((0, 3)), 10).shape == (0, 3)
+
+def test_curves_windows():
+    from popmachine import DataSet
+    from popmachine.application.plot import curves
+
+    ds = DataSet(pd.DataFrame(np.random.rand(11, 2), index=np.arange(11.)), pd.DataFrame({'strain': ['wt', 'mutant']}))
+
+    # samples just outside of the window are included
+    xs, ys = curves(ds, 2.5, 5.5, 800)
+    assert xs == [[2., 3., 4., 5., 6.]]*2
+
+    # a window between two samples
+    xs, ys = curves(ds, 2.2, 2.8, 800)
+    assert xs == [[2., 3.]]*2
+
+    # windows outside of the data
+    xs, ys = curves(ds, 20, 30, 800)
+    assert xs == [[10.]]*2
+    xs, ys = curves(ds, -30, -20, 800)
+    assert xs == [[0.]]*2
+
+    xs, ys = curves(ds, None, None, 800)
+    assert xs == [range(11)]*2 and len(ys[0]) == 11
@@ -0,0 +1,31 @@
+import popmachine
+from popmachine.operation import BatchImport
+import pandas as pd
+import os, shutil, tempfile
+
+def test_batch_import_continues_after_a_failed_plate():
+    """Test that a plate whose design does not match its data is reported as failed, and the other plates imported."""
+
+    directory = tempfile.mkdtemp()
+    try:
+        data = pd.DataFrame({'time': [0., 1.], 'a': [.1, .2], 'b': [.3, .4]}, columns=['time', 'a', 'b'])
+        meta = pd.DataFrame({'strain': ['wt', 'mutant']})
+
+        for name in ['p1', 'p2', 'p3', 'p4']:
+            os.makedirs(os.path.join(directory, 'plates', name))
+            data.to_csv(os.path.join(directory, 'plates', name, 'data.csv'), index=False)
+            meta.iloc[:1 if name == 'p2' else 2].to_csv(os.path.join(directory, 'plates', name, 'meta.csv'), index=False)
+
+        machine = popmachine.Machine(os.path.join(directory, 'test.db'))
+        machine.createPlate('p3', data=data, experimentalDesign=meta)
+
+        report = BatchImport(machine, os.path.join(directory, 'plates'), processes=1).run()
+
+        # a single process reads the plates in order, p4 comes after the failure
+        assert [(r[0], r[1]) for r in report] == [('p1', 'created'), ('p2', 'failed'), ('p3', 'exists'), ('p4', 'created')]
+        assert sorted(machine.plates(names=True)) == ['p1', 'p3', 'p4']
+        assert machine.search(plates=['p4'], include=['strain']).meta.strain.tolist() == ['wt', 'mutant']
+
+        machine.close()
+    finally:
+        shutil.rmtree(directory)
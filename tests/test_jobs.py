@@ -0,0 +1,51 @@
+import popmachine
+from popmachine.jobs import JobQueue, import_plate
+import pandas as pd
+import os, shutil, tempfile, subprocess
+
+def test_import_plate_job():
+    """Test that plates are imported in the background, and failures reported."""
+
+    directory = tempfile.mkdtemp()
+    try:
+        machine = popmachine.Machine(os.path.join(directory, 'test.db'))
+        jobs = JobQueue(machine)
+
+        data = os.path.join(directory, 'data.csv')
+        meta = os.path.join(directory, 'meta.csv')
+        pd.DataFrame({'time': [0., 1.], 'a': [.1, .2], 'b': [.3, .4]}, columns=['time', 'a', 'b']).to_csv(data, index=False)
+        pd.DataFrame({'strain': ['wt', 'mutant'], 'skip': [1, 2]}).to_csv(meta, index=False)
+
+        created = jobs.submit('plate-create', 'plate', import_plate, machine, 'plate', data, meta, 'csv', ['skip'])
+        missing = jobs.submit('plate-create', 'missing', import_plate, machine, 'missing', os.path.join(directory, 'missing.csv'))
+        jobs.close()
+
+        status = jobs.status(created)
+        assert status['status'] == 'done'
+        assert status['progress'] == 1.
+        assert not os.path.exists(data) and not os.path.exists(meta)
+
+        search = machine.search(plates=['plate'], include=['strain', 'skip'])
+        assert search.meta.strain.tolist() == ['wt', 'mutant']
+        assert not 'skip' in search.meta
+
+        assert jobs.status(missing)['status'] == 'failed'
+        assert jobs.status(-1) is None
+
+        # unfinished jobs of processes that are gone are failed, not those of live ones
+        dead = subprocess.Popen(['true'])
+        dead.wait()
+
+        table = popmachine.models.Job.__table__
+        owners = [jobs.owner, '%s:%d' % (jobs.host, dead.pid), None]
+        ids = [machine.engine.execute(table.insert().values(kind='plate-create', status='running', owner=o)).inserted_primary_key[0] for o in owners]
+
+        queue = JobQueue(machine)
+        assert queue.status(ids[0])['status'] == 'running'
+        for id in ids[1:]:
+            status = queue.status(id)
+            assert status['status'] == 'failed' and status['message'] == 'interrupted'
+
+        machine.close()
+    finally:
+        shutil.rmtree(directory)
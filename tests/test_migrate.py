@@ -0,0 +1,35 @@
+from hypothesis import given
+import hypothesis.strategies as st
+
+import popmachine
+from utils import charstring
+
+import os, shutil, tempfile, sqlite3
+
+values = st.lists(st.one_of(charstring, st.integers().map(str), st.floats(allow_nan=False).map(repr)), min_size=1, unique=True)
+
+@given(values)
+def test_migrate_adds_numeric_design_values(values):
+    """Test that experimental designs of databases without numeric values are migrated."""
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'test.db')
+
+    try:
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE experimental_design (id INTEGER NOT NULL, design_id INTEGER, value VARCHAR, PRIMARY KEY (id))")
+        conn.executemany("INSERT INTO experimental_design (design_id, value) VALUES (1, ?)", [(v,) for v in values])
+        conn.commit()
+        conn.close()
+
+        machine = popmachine.Machine(path)
+
+        for ed in machine.session.query(popmachine.models.ExperimentalDesign):
+            assert ed.number == popmachine.models.number(ed.value)
+
+        indexes = [r[0] for r in machine.engine.execute("SELECT name FROM sqlite_master WHERE type='index'")]
+        assert 'ix_experimental_design_number' in indexes
+
+        machine.close()
+    finally:
+        shutil.rmtree(directory)
@@ -2,6 +2,7 @@ from hypothesis import given, settings
 import hypothesis.strategies as st
 
 import popmachine
+import os, shutil, tempfile
 from utils import platename, StatelessDatabaseTest
 from dataset.fullfactorial import fullfactorialDataset
 from dataset import incomplete
@@ -34,3 +35,80 @@ class TestPlate(StatelessDatabaseTest):
     @given(platename, incomplete.dataset())
     def test_plate_creation_and_deletion_incomplete(self, name , dataset):
         plate_create_check(self.machine, name, dataset)
+
+    @given(st.lists(platename,min_size=2,max_size=2, unique=True), fullfactorialDataset)
+    def test_plate_creation_reuses_experimental_designs(self, names, dataset):
+        n1, n2 = names
+
+        self.machine.createPlate(n1,data=dataset.data,experimentalDesign=dataset.meta)
+        count = self.machine.session.query(popmachine.models.ExperimentalDesign).count()
+        assert count == sum([dataset.meta[c].unique().shape[0] for c in dataset.meta.columns])
+
+        self.machine.createPlate(n2,data=dataset.data,experimentalDesign=dataset.meta)
+        assert count == self.machine.session.query(popmachine.models.ExperimentalDesign).count()
+
+        for ed in self.machine.session.query(popmachine.models.ExperimentalDesign):
+            assert len(ed.wells) == 2 * (dataset.meta[ed.design.name] == ed.value).sum()
+
+        self.machine.deletePlate(n1)
+        self.machine.deletePlate(n2)
+
+    @given(platename, incomplete.dataset())
+    def test_plate_data_table_reflected_on_first_access(self, name, dataset):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'test.db')
+
+        try:
+            machine = popmachine.Machine(path)
+            machine.createPlate(name,data=dataset.data,experimentalDesign=dataset.meta)
+            search = machine.search(plates=[name], include=dataset.meta.columns.tolist())
+            machine.close()
+
+            machine = popmachine.Machine(path)
+            assert len(machine.metadata.tables) == 0
+
+            plate = list(machine.plates())[0]
+            assert machine.search(plates=[name], include=dataset.meta.columns.tolist()) == search
+            assert plate.data_table in machine.metadata.tables
+            machine.close()
+        finally:
+            shutil.rmtree(directory)
+
+    @given(platename, incomplete.dataset())
+    def test_plate_summary(self, name, dataset):
+        plate = self.machine.createPlate(name,data=dataset.data,experimentalDesign=dataset.meta)
+
+        summary = plate.summary
+        assert summary.wells == dataset.meta.shape[0]
+        assert summary.timepoints == dataset.data.shape[0]
+
+        counts = dict([((v.experimentalDesign.design.name, v.experimentalDesign.value), v.count) for v in summary.values])
+        assert sum(counts.values()) == dataset.meta.notnull().values.sum()
+        for ed in self.machine.session.query(popmachine.models.ExperimentalDesign):
+            assert counts[(ed.design.name, ed.value)] == len(ed.wells)
+
+        self.machine.deletePlate(name)
+        assert self.machine.session.query(popmachine.models.PlateSummary).count() == 0
+        assert self.machine.session.query(popmachine.models.PlateDesignValue).count() == 0
+
+    @given(platename, incomplete.dataset())
+    def test_plate_summary_created_for_existing_plates(self, name, dataset):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'test.db')
+
+        try:
+            machine = popmachine.Machine(path)
+            summary = machine.createPlate(name,data=dataset.data,experimentalDesign=dataset.meta).summary
+            expected = (summary.wells, summary.timepoints, summary.time_min, summary.time_max, len(summary.values))
+
+            # a database of a version without summaries
+            popmachine.models.PlateDesignValue.__table__.drop(machine.engine)
+            popmachine.models.PlateSummary.__table__.drop(machine.engine)
+            machine.close()
+
+            machine = popmachine.Machine(path)
+            summary = list(machine.plates())[0].summary
+            assert (summary.wells, summary.timepoints, summary.time_min, summary.time_max, len(summary.values)) == expected
+            machine.close()
+        finally:
+            shutil.rmtree(directory)
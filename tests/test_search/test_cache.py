@@ -0,0 +1,40 @@
+from hypothesis import given
+import hypothesis.strategies as st
+
+import popmachine
+from ..utils import platename, StatelessDatabaseTest
+from ..dataset.incomplete import dataset
+
+class TestCache(StatelessDatabaseTest):
+
+    @given(st.lists(platename,min_size=2,max_size=2, unique=True), dataset())
+    def test_search_cache_invalidated_by_changes(self, names, ds):
+        n1, n2 = names
+        include = ds.meta.columns.tolist()
+
+        self.machine.createPlate(n1,data=ds.data,experimentalDesign=ds.meta)
+
+        search = self.machine.search(include=include)
+        assert len(self.machine.cache) == 1
+
+        # cached results are copies
+        search.meta['plate'] = None
+        assert not self.machine.search(include=include) == search
+        assert len(self.machine.cache) == 1
+
+        self.machine.createPlate(n2,data=ds.data,experimentalDesign=ds.meta)
+        search = self.machine.search(include=include)
+        assert search.meta.shape[0] == 2 * ds.meta.shape[0]
+
+        design = self.machine.session.query(popmachine.models.Design).first()
+        generation = self.machine.generation
+        design.description = 'changed'
+        self.machine.session.commit()
+        assert self.machine.generation > generation
+
+        self.machine.deletePlate(n2)
+        search = self.machine.search(include=include)
+        assert search.meta.shape[0] == ds.meta.shape[0]
+
+        self.machine.deletePlate(n1)
+        assert self.machine.search(include=include) is None
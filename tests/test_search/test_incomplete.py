@@ -121,6 +121,65 @@ class TestSearch(StatelessDatabaseTest):
 
         self.machine.deletePlate(name)
 
+    @given(st.lists(platename,min_size=2,max_size=2, unique=True),\
+            dataset(nobs=st.integers(min_value=1,max_value=20)),\
+            dataset(nobs=st.integers(min_value=1,max_value=20)))
+    def test_search_aligns_plates_on_time(self, names, ds1, ds2):
+        """Test that wells from multiple plates are aligned on time, ordered by first appearance."""
+
+        n1, n2 = names
+        self.machine.createPlate(n1,data=ds1.data,experimentalDesign=ds1.meta)
+        self.machine.createPlate(n2,data=ds2.data,experimentalDesign=ds2.meta)
+
+        search = self.machine.search(plates=names)
+
+        # plates are aligned in the order their wells are returned
+        order = pd.unique(search.meta.plate).tolist()
+        datasets = [(ds1, ds2), (ds2, ds1)][order.index(n1)]
+
+        time = pd.unique(np.concatenate([d.data.index.values for d in datasets]))
+        assert search.data.shape == (time.shape[0], ds1.data.shape[1] + ds2.data.shape[1])
+        assert (search.data.index.values == time).all()
+
+        for n, d in zip(names, (ds1, ds2)):
+            select = (search.meta.plate==n).values
+            temp = search.data.loc[:, select]
+            temp.columns = search.meta.number[select]
+            temp = temp.sort_index(axis=1).reindex(d.data.index)
+
+            assert np.allclose(temp.values, d.data.values, equal_nan=True)
+
+        self.machine.deletePlate(n1)
+        self.machine.deletePlate(n2)
+
+    @given(st.lists(platename,min_size=2,max_size=2, unique=True),\
+            dataset(nobs=st.integers(min_value=1,max_value=20)),\
+            st.integers(min_value=1, max_value=5))
+    def test_search_iter_chunks(self, names, ds, chunksize):
+        """Test that search_iter yields the wells of search in single plate chunks."""
+
+        include = ds.meta.columns.tolist()
+        for n in names:
+            self.machine.createPlate(n,data=ds.data,experimentalDesign=ds.meta)
+
+        search = self.machine.search(include=include)
+        chunks = list(self.machine.search_iter(include=include, chunksize=chunksize))
+
+        assert sum([c.data.shape[1] for c in chunks]) == search.data.shape[1]
+
+        for c in chunks:
+            assert c.data.shape[1] <= chunksize
+            assert c.meta.plate.unique().shape[0] == 1
+            assert c.meta.columns.tolist() == search.meta.columns.tolist()
+
+            for j, r in c.meta.iterrows():
+                k = ((search.meta.plate==r.plate) & (search.meta.number==r.number)).values.argmax()
+                assert search.meta.iloc[k].equals(r)
+                assert np.allclose(search.data.iloc[:,k].reindex(c.data.index).values, c.data.iloc[:,j].values, equal_nan=True)
+
+        for n in names:
+            self.machine.deletePlate(n)
+
     @given(sharedDesignSpace, compendia())
     def test_compendia_search(self, dsp, cmp):
         """Test that a compendia of datasets from a shared designspace can be searched properly."""
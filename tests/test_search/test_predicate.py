@@ -0,0 +1,54 @@
+from hypothesis import given
+import hypothesis.strategies as st
+import pandas as pd
+import numpy as np
+
+import popmachine
+from popmachine.search import Between, Not, Less, GreaterEqual
+from ..utils import platename, StatelessDatabaseTest
+
+# values that survive the text representation of design values
+concentration = st.integers(min_value=-10**6, max_value=10**6).map(lambda x: x/100.)
+concentrations = st.lists(concentration, min_size=1, max_size=20)
+bounds = st.tuples(concentration, concentration)
+
+class TestPredicate(StatelessDatabaseTest):
+
+    def create(self, name, concentration):
+        meta = pd.DataFrame({'concentration': concentration,
+                            'strain': [['wt', 'mutant'][i%2] for i in range(len(concentration))]})
+        data = pd.DataFrame(np.zeros((3, meta.shape[0])), index=[0., 1., 2.])
+
+        self.machine.createPlate(name, data=data, experimentalDesign=meta)
+
+        design = self.machine.session.query(popmachine.models.Design)\
+                    .filter(popmachine.models.Design.name=='concentration').one()
+        design.type = 'float'
+        self.machine.session.commit()
+
+        return meta
+
+    def count(self, **kwargs):
+        wells = self.machine.filter(**kwargs)
+        return len(wells.all())
+
+    @given(platename, concentrations, bounds)
+    def test_numeric_predicates(self, name, concentration, bounds):
+        meta = self.create(name, concentration)
+        low, high = sorted(bounds)
+
+        assert self.count(concentration=Between(low, high)) == ((meta.concentration>=low) & (meta.concentration<=high)).sum()
+        assert self.count(concentration=Less(high)) == (meta.concentration<high).sum()
+        assert self.count(concentration=GreaterEqual(low)) == (meta.concentration>=low).sum()
+
+        self.machine.deletePlate(name)
+
+    @given(platename, concentrations)
+    def test_not_predicate(self, name, concentration):
+        meta = self.create(name, concentration)
+
+        assert self.count(strain=Not('wt')) == (meta.strain!='wt').sum()
+        assert self.count(strain=Not(['wt', 'mutant'])) == 0
+        assert self.count(strain=Not('wt'), concentration=Between(min(concentration), max(concentration))) == (meta.strain!='wt').sum()
+
+        self.machine.deletePlate(name)
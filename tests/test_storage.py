@@ -0,0 +1,36 @@
+from hypothesis import given
+import hypothesis.strategies as st
+
+import popmachine
+from utils import platename
+from dataset import incomplete
+
+import unittest
+
+class TestStorage(unittest.TestCase):
+
+    def setup_example(self,):
+        self.table = popmachine.Machine(":memory:", storage='table')
+        self.long = popmachine.Machine(":memory:", storage='long')
+
+    @given(platename, incomplete.dataset())
+    def test_storages_search_same_data(self, name, dataset):
+        """Test that searches return the same dataset from both storage layouts."""
+
+        for m in [self.table, self.long]:
+            plate = m.createPlate(name,data=dataset.data,experimentalDesign=dataset.meta)
+            assert m.plateStorage(plate) is m.storage
+
+        search = self.table.search(plates=[name], include=dataset.meta.columns.tolist())
+        search2 = self.long.search(plates=[name], include=dataset.meta.columns.tolist())
+
+        assert search == search2
+
+        numbers = range(dataset.meta.shape[0])[::-1]
+        search = self.table.search(plates=[name], numbers=numbers)
+        search2 = self.long.search(plates=[name], numbers=numbers)
+
+        assert search == search2
+
+        self.long.deletePlate(name)
+        assert self.long.engine.execute(popmachine.models.plate_data.select()).fetchall() == []